@@ -1,104 +1,180 @@
-import pandas as pd
-import re
+import os
 import tkinter as tk
-from tkinter import filedialog
+from tkinter import filedialog, ttk
+from batch import process_pair
+from bom_loader import read_excel_sheet
+from excel_export import updated_file_name
+from jobs import JobManager
+from multi_sheet import ALL_SHEETS
+from report_merge import MERGE_POLICIES, DEFAULT_POLICY
+
+# Intervalle de rafraîchissement de la file et de la progression (ms)
+POLL_INTERVAL = 100
 
 def xlsx_to_csv(excel_file):
-    df = pd.read_excel(excel_file)
-    
+    df = read_excel_sheet(excel_file)
+
     csv_file = excel_file.replace('.xlsx', '.csv')
     df.to_csv(csv_file, index=False)
-    
+
     return csv_file
 
-def extract_coverage_from_report(text_file_path):
-    coverage_data = {}
-    
-    with open(text_file_path, 'r', encoding='utf-8', errors='ignore') as file:
-        text_content = file.read()
-    
-    # Patterns pour trouver les informations de coverage dans le rapport
-    # Cherche les patterns comme "Test Summary for U10 (MC14519)" suivi de "Totals:" et "100.00%"
-    component_blocks = re.findall(r'Test Summary for ([A-Z]+\d+).*?Totals:.*?(\d+\.\d+)%', 
-                                  text_content, re.DOTALL)
-    
-    for component, coverage in component_blocks:
-        coverage_data[component] = f"{float(coverage):.2f}%"
-    
-    return coverage_data
-
-def update_excel_with_coverage(excel_file_path, coverage_data, output_file=None):
-    df = pd.read_excel(excel_file_path)
-    
-    if "COVERAGE %" not in df.columns:
-        df["COVERAGE %"] = None
-    
-    for index, row in df.iterrows():
-        component = row["COMP."]
-        if component in coverage_data:
-            df.at[index, "COVERAGE %"] = coverage_data[component]
-        else:
-            df.at[index, "COVERAGE %"] = "0%"
-    
-    if output_file is None:
-        output_file = excel_file_path.replace('.xlsx', '_updated.xlsx')
-    
-    df.to_excel(output_file, index=False)
-    
-    return df
+def process_files(job, excel_path, text_paths, policy, all_sheets=False):
+    # Exécuté dans le thread de travail : même moteur que Streamlit et le traitement par lots
+    # (statuts COVERAGE % / PPVS / REMARKS, export formaté), sans aucun appel à Tk
+    output_path = os.path.join(os.path.dirname(excel_path), updated_file_name(os.path.basename(excel_path)))
+    # Toutes les feuilles : une carte par feuille, chacune avec le rapport portant son nom
+    result = process_pair(excel_path, text_paths, output_path, policy=policy,
+                          report_workers=os.cpu_count(), progress=job.report,
+                          sheet_names=ALL_SHEETS if all_sheets else None)
+    result["output"] = output_path
+    return result
+
+def _progress_text(stage, done, total):
+    if done is None or not total:
+        return stage
+    if stage.startswith("Analyse du rapport"):
+        return f"{stage}: {done / 1024 / 1024:.1f} / {total / 1024 / 1024:.1f} Mo"
+    if stage == "Jointure des feuilles":
+        return f"{stage}: {done} / {total} feuilles"
+    return f"{stage}: {done} / {total} lignes"
+
+def _job_text(job, excel_path):
+    name = os.path.basename(excel_path)
+    status = job.status
+    if status == "terminé":
+        result = job.result()
+        text = f"{name} - terminé ({result['processed']} composants traités sur {result['rows']} lignes"
+        report_only = result["unmatched"]["report"]
+        if report_only:
+            # Les premiers composants du rapport sans ligne correspondante dans la nomenclature
+            text += f", absents de la nomenclature: {', '.join(report_only[:10])}{'...' if len(report_only) > 10 else ''}"
+        return text + ")"
+    if status == "erreur":
+        return f"{name} - erreur: {job.error()}"
+    return f"{name} - {status}"
 
 def main():
     root = tk.Tk()
     root.title("Coverage Excel Update")
-    root.geometry("600x400")
-    
+    root.geometry("700x520")
+
+    # Un seul thread de travail : les traitements ajoutés s'exécutent dans l'ordre de la file
+    manager = JobManager(max_workers=1)
+    queue = []
+
     excel_path = tk.StringVar()
     text_path = tk.StringVar()
+    policy = tk.StringVar(value=MERGE_POLICIES[DEFAULT_POLICY])
+    all_sheets = tk.BooleanVar(value=False)
     status_message = tk.StringVar()
     status_message.set("Selectionnez les fichiers pour commencer")
-    
+
     file_frame = tk.Frame(root, pady=20)
     file_frame.pack(fill="x")
-    
+
     tk.Label(file_frame, text="Excel/CSV:").grid(row=0, column=0, padx=5, sticky="w")
     tk.Entry(file_frame, textvariable=excel_path, width=50).grid(row=0, column=1, padx=5)
     tk.Button(file_frame, text="Parcourir", command=lambda: excel_path.set(tk.filedialog.askopenfilename(
         filetypes=[("Fichiers Excel", "*.xlsx"), ("Fichiers CSV", "*.csv")]))).grid(row=0, column=2, padx=5)
-    
-    tk.Label(file_frame, text="Coverage Report:").grid(row=1, column=0, padx=5, sticky="w")
+
+    # Plusieurs rapports (un par programme de test) peuvent être sélectionnés, séparés par ";"
+    tk.Label(file_frame, text="Coverage Report(s):").grid(row=1, column=0, padx=5, sticky="w")
     tk.Entry(file_frame, textvariable=text_path, width=50).grid(row=1, column=1, padx=5)
-    tk.Button(file_frame, text="Parcourir", command=lambda: text_path.set(tk.filedialog.askopenfilename(
-        filetypes=[("Fichiers texte", "*.txt")]))).grid(row=1, column=2, padx=5)
-
-    def process_files():
-        try:
-            if not excel_path.get() or not text_path.get():
-                status_message.set("Veuillez sélectionner les deux fichiers")
-                return
-                
-            coverage_data = extract_coverage_from_report(text_path.get())
-            
-            if not coverage_data:
-                status_message.set("Aucune donnée de couverture trouvée dans le fichier texte")
-                return
-                
-            updated_df = update_excel_with_coverage(excel_path.get(), coverage_data)
-            
-            status_message.set(f"Succès! Fichier Excel mis à jour enregistré sous '{excel_path.get().replace('.xlsx', '_updated.xlsx')}'")
-        except Exception as e:
-            status_message.set(f"Erreur: {str(e)}")
-    
-    tk.Button(root, text="Traiter les fichiers", command=process_files, 
-                bg="#4CAF50", fg="white", font=("Arial", 12, "bold"), 
-                pady=10, padx=20).pack(pady=20)
-    
+    tk.Button(file_frame, text="Parcourir", command=lambda: text_path.set(";".join(tk.filedialog.askopenfilenames(
+        filetypes=[("Fichiers texte", "*.txt"), ("Rapports compressés", "*.gz *.xz *.bz2 *.zip"),
+                   ("Tous les fichiers", "*")])))).grid(row=1, column=2, padx=5)
+
+    tk.Label(file_frame, text="Fusion des rapports:").grid(row=2, column=0, padx=5, sticky="w")
+    ttk.Combobox(file_frame, textvariable=policy, values=list(MERGE_POLICIES.values()),
+                 state="readonly", width=47).grid(row=2, column=1, padx=5, sticky="w")
+    tk.Checkbutton(file_frame, text="Toutes les feuilles (une carte par feuille)",
+                   variable=all_sheets).grid(row=3, column=1, padx=5, sticky="w")
+
+    def add_to_queue():
+        if not excel_path.get() or not text_path.get():
+            status_message.set("Veuillez sélectionner les deux fichiers")
+            return
+
+        text_paths = [path for path in text_path.get().split(";") if path]
+        policy_name = next(name for name, label in MERGE_POLICIES.items() if label == policy.get())
+        job = manager.submit(process_files, excel_path.get(), text_paths, policy_name,
+                             all_sheets.get() and excel_path.get().endswith(".xlsx"), key=excel_path.get())
+        queue.append(job)
+        queue_list.insert("end", _job_text(job, job.key))
+        status_message.set(f"{len(queue)} traitement(s) dans la file")
+
+    def cancel():
+        # Traitement sélectionné dans la file, sinon celui en cours
+        selection = queue_list.curselection()
+        if selection:
+            jobs = [queue[selection[0]]]
+        else:
+            jobs = [job for job in queue if job.status == "en cours"]
+        for job in jobs:
+            job.cancel()
+
+    button_frame = tk.Frame(root)
+    button_frame.pack(pady=10)
+    tk.Button(button_frame, text="Ajouter à la file", command=add_to_queue,
+                bg="#4CAF50", fg="white", font=("Arial", 12, "bold"),
+                pady=10, padx=20).pack(side="left", padx=10)
+    tk.Button(button_frame, text="Annuler", command=cancel,
+                font=("Arial", 12), pady=10, padx=20).pack(side="left", padx=10)
+
+    queue_frame = tk.Frame(root)
+    queue_frame.pack(fill="both", expand=True, padx=20)
+    tk.Label(queue_frame, text="File de traitement:").pack(anchor="w")
+    queue_list = tk.Listbox(queue_frame, height=6)
+    queue_list.pack(fill="both", expand=True)
+
+    progress_text = tk.StringVar()
+    progress_bar = ttk.Progressbar(root, mode="determinate", maximum=1.0)
+    progress_bar.pack(fill="x", padx=20, pady=(10, 0))
+    tk.Label(root, textvariable=progress_text).pack(anchor="w", padx=20)
+
     status_frame = tk.Frame(root, pady=10)
     status_frame.pack(fill="x")
     tk.Label(status_frame, text="Statut:").pack(anchor="w", padx=20)
-    tk.Label(status_frame, textvariable=status_message, wraplength=500,
+    tk.Label(status_frame, textvariable=status_message, wraplength=600,
                 justify="left", fg="blue").pack(anchor="w", padx=20)
-    
+
+    def poll():
+        # Les threads de travail ne touchent pas à Tk : la boucle d'événements relit leur état
+        for index, job in enumerate(queue):
+            text = _job_text(job, job.key)
+            if queue_list.get(index) != text:
+                selected = index in queue_list.curselection()
+                queue_list.delete(index)
+                queue_list.insert(index, text)
+                if selected:
+                    queue_list.selection_set(index)
+
+        running = next((job for job in queue if job.status == "en cours"), None)
+        if running is not None and running.stage is not None:
+            done, total = running.progress.get(running.stage, (None, None))
+            progress_bar["value"] = done / total if done is not None and total else 0.0
+            progress_text.set(_progress_text(running.stage, done, total))
+        else:
+            progress_bar["value"] = 0.0
+            progress_text.set("")
+
+        finished = [job for job in queue if job.done()]
+        if queue and len(finished) == len(queue):
+            failures = sum(job.status != "terminé" for job in finished)
+            status_message.set(f"File terminée: {len(finished) - failures} réussi(s), {failures} échec(s) ou annulation(s). "
+                               f"Fichiers mis à jour enregistrés à côté des nomenclatures (_updated.xlsx)")
+        root.after(POLL_INTERVAL, poll)
+
+    def close():
+        for job in queue:
+            job.cancel()
+        manager.shutdown(wait=False)
+        root.destroy()
+
+    root.protocol("WM_DELETE_WINDOW", close)
+    root.after(POLL_INTERVAL, poll)
     root.mainloop()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
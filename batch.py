@@ -0,0 +1,450 @@
+"""Traitement par lots, sans interface, de paires nomenclature / rapport.
+
+Exemples :
+    python batch.py cartes/                   # un sous-dossier par carte
+    python batch.py manifeste.csv -j 8 -o sortie/
+    python batch.py cartes/ --metrics mesures.json
+    python batch.py cartes/ --merge --policy latest
+    python batch.py panneaux/ --sheets            # une carte par feuille du classeur
+
+Le manifeste est un CSV avec les colonnes "bom", "report" et, en option,
+"output" ; les chemins relatifs sont résolus depuis le dossier du manifeste.
+Plusieurs rapports d'une même carte sont séparés par ";" dans la colonne
+"report" et fusionnés selon la règle choisie (--policy).
+Le code de sortie est non nul dès qu'une paire échoue.
+"""
+import argparse
+import csv
+import json
+import os
+import shutil
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from bom_loader import read_excel_sheets, read_nomenclature
+from columnar_export import TABLE_FORMATS, columnar_frame, report_table, table_file_names, write_table
+from completion import apply_report_data, has_report_data, report_components
+from component_index import ComponentIndex
+from excel_export import export_nomenclature, export_workbook, load_dropdown_columns, updated_file_name
+from history import board_name, combined_hash, record_run
+from incremental import WorkbookPatch
+from ingestion import expand_archives, looks_like_report, read_report, report_stem
+from instrumentation import StageMetrics
+from multi_sheet import ALL_SHEETS, combined_frame, complete_sheets, sheet_reports
+from report_cache import content_hash
+from report_merge import MERGE_POLICIES, DEFAULT_POLICY, merge_reports, read_reports
+
+BOM_SUFFIXES = (".xlsx", ".csv")
+
+
+class BatchError(Exception):
+    pass
+
+
+def _is_bom(file_name, incremental=False):
+    # En mode incrémental, seuls les classeurs déjà complétés sont des nomenclatures
+    if incremental:
+        return file_name.endswith("_updated.xlsx")
+    return file_name.lower().endswith(BOM_SUFFIXES) and not file_name.endswith("_updated.xlsx")
+
+
+def _is_report(folder, file_name):
+    # Extension de rapport connue ; un fichier sans extension (README, Makefile...) doit contenir une section
+    if file_name.startswith("."):
+        return False
+    if report_stem(file_name) is not None:
+        return True
+    return not os.path.splitext(file_name)[1] and looks_like_report(os.path.join(folder, file_name))
+
+
+def find_pairs(directory, incremental=False, merge=False):
+    """Associe les nomenclatures et les rapports d'un dossier et de ses sous-dossiers directs.
+
+    Un dossier contenant une seule nomenclature et un seul rapport (ou, avec
+    `merge`, plusieurs rapports à fusionner) forme une paire ; sinon les
+    fichiers sont associés par nom (carte.xlsx + carte.txt).
+    """
+    folders = [directory] + sorted(
+        entry.path for entry in os.scandir(directory) if entry.is_dir() and not entry.name.startswith(".")
+    )
+    pairs = []
+    for folder in folders:
+        file_names = sorted(entry.name for entry in os.scandir(folder) if entry.is_file())
+        boms = [name for name in file_names if _is_bom(name, incremental)]
+        reports = [name for name in file_names if _is_report(folder, name)]
+
+        if len(boms) == 1 and (len(reports) == 1 or (merge and reports)):
+            pairs.append((os.path.join(folder, boms[0]), [os.path.join(folder, name) for name in reports], None))
+            continue
+
+        reports_by_stem = {report_stem(name) or name: name for name in reports}
+        for bom in boms:
+            stem = os.path.splitext(bom)[0]
+            if incremental:
+                stem = stem[:-len("_updated")]
+            report = reports_by_stem.get(stem)
+            if report is not None:
+                pairs.append((os.path.join(folder, bom), [os.path.join(folder, report)], None))
+    return pairs
+
+
+def read_manifest(manifest_path):
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    pairs = []
+    with open(manifest_path, newline="", encoding="utf-8") as manifest:
+        for line_number, row in enumerate(csv.DictReader(manifest), start=2):
+            if not row.get("bom") or not row.get("report"):
+                raise BatchError(f"{manifest_path}:{line_number}: colonnes 'bom' et 'report' obligatoires")
+            output = row.get("output") or None
+            pairs.append((
+                os.path.join(base_dir, row["bom"]),
+                [os.path.join(base_dir, report.strip()) for report in row["report"].split(";") if report.strip()],
+                os.path.join(base_dir, output) if output else None,
+            ))
+    return pairs
+
+
+def process_pair(bom_path, report_paths, output_path, incremental=False, metrics=None, report_workers=1,
+                 policy=DEFAULT_POLICY, history_path=None, dropdown_columns=None, progress=None,
+                 table_format=None, write_xlsx=True, sheet_names=None):
+    """Traite une paire et retourne ses compteurs et la durée de chaque étape.
+
+    En mode incrémental, la nomenclature est un classeur déjà complété dont
+    seules les cellules modifiées par le rapport sont réécrites. Un rapport
+    volumineux est analysé sur `report_workers` processus ; plusieurs
+    rapports (dont ceux d'une archive zip) sont analysés simultanément puis
+    fusionnés selon `policy`. Les rapports compressés (gzip, xz, bzip2) sont
+    décompressés au fil de l'analyse.
+    Avec `history_path`, les statuts par composant sont ajoutés à l'historique.
+    `dropdown_columns` remplace les valeurs des menus déroulants de l'export.
+    `progress(étape, fait, total)` est appelée au fil du traitement (interface
+    Tkinter) ; une exception levée par elle interrompt le traitement sans
+    laisser de fichier de sortie incomplet. Avec `table_format`, la
+    nomenclature complétée et la table du rapport sont aussi écrites en
+    Parquet, Arrow IPC ou CSV à côté de la sortie ; sans `write_xlsx`, le
+    classeur formaté n'est pas produit. Avec `sheet_names` (liste de noms ou
+    ALL_SHEETS), la nomenclature est un classeur d'une carte par feuille,
+    traité par `process_workbook_pair`.
+    """
+    metrics = metrics or StageMetrics(track_memory=False)
+    progress = progress or (lambda stage, done=None, total=None: None)
+    if isinstance(report_paths, (str, os.PathLike)):
+        report_paths = [report_paths]
+    if sheet_names is not None:
+        if incremental:
+            raise BatchError("le mode incrémental ne traite que la première feuille")
+        return process_workbook_pair(bom_path, report_paths, output_path, metrics, report_workers, policy,
+                                     history_path, dropdown_columns, progress, table_format, write_xlsx,
+                                     None if sheet_names == ALL_SHEETS else sheet_names)
+
+    with metrics.stage("rapport"):
+        report_data = _read_report_paths(report_paths, report_workers, policy, progress)
+    if not has_report_data(report_data):
+        raise BatchError("aucune donnée trouvée dans le rapport")
+
+    if history_path:
+        progress("Historique")
+        with metrics.stage("historique"):
+            record_run(report_data, board_name(bom_path), _reports_hash(report_paths, policy),
+                       ", ".join(os.path.basename(path) for path in report_paths), path=history_path)
+
+    if incremental:
+        progress("Mise à jour incrémentale")
+        with metrics.stage("incrémental"):
+            patch = WorkbookPatch(bom_path, report_data)
+            if patch.modified:
+                # La sortie peut être la nomenclature elle-même : elle n'est remplacée qu'une fois écrite
+                _write_atomic(output_path, patch.write)
+            elif not os.path.exists(output_path) or not os.path.samefile(bom_path, output_path):
+                # Aucune modification : le classeur est recopié dans le dossier de sortie, sans être réécrit
+                shutil.copyfile(bom_path, output_path)
+        return {"changes": len(patch.changes), "timings": metrics.timings()}
+
+    progress("Lecture de la nomenclature")
+    with metrics.stage("nomenclature"):
+        with open(bom_path, "rb") as excel_file:
+            df = read_nomenclature(excel_file)
+        index = ComponentIndex(df["COMP."] if "COMP." in df.columns else [])
+        df, format_info, processed_count = apply_report_data(df, report_data, index)
+        bom_only, report_only = index.unmatched(report_components(report_data))
+    progress("Jointure des statuts", int((format_info != "").sum()), len(df))
+
+    outputs = []
+    if write_xlsx:
+        outputs.append(output_path)
+        with metrics.stage("export"):
+            _write_atomic(output_path, lambda output: export_nomenclature(
+                df, format_info, output, dropdown_columns=dropdown_columns,
+                progress=lambda done, total: progress("Export Excel", done, total)))
+
+    if table_format:
+        progress("Export en colonnes")
+        with metrics.stage("colonnes"):
+            output_dir = os.path.dirname(output_path)
+            names = table_file_names(os.path.basename(bom_path), table_format)
+            tables = {"nomenclature": lambda: columnar_frame(df), "report": lambda: report_table(report_data)}
+            for table, build in tables.items():
+                path = os.path.join(output_dir, names[table])
+                _write_atomic(path, lambda output: write_table(build(), output, table_format))
+                outputs.append(path)
+
+    return {"rows": len(df), "processed": processed_count, "outputs": outputs,
+            "unmatched": {"nomenclature": bom_only, "report": report_only}, "timings": metrics.timings()}
+
+
+def _read_report_paths(report_paths, report_workers, policy, progress):
+    # Les archives zip sont remplacées par les rapports qu'elles contiennent
+    sources = expand_archives(report_paths)
+    if not sources:
+        raise BatchError("aucun rapport dans les fichiers fournis")
+    if len(sources) == 1:
+        return read_report(sources[0], workers=report_workers,
+                           progress=lambda done, total: progress("Analyse du rapport", done, total))
+    progress("Analyse des rapports")
+    return merge_reports(read_reports(sources, workers=report_workers), policy)
+
+
+def process_workbook_pair(bom_path, report_paths, output_path, metrics, report_workers=1, policy=DEFAULT_POLICY,
+                          history_path=None, dropdown_columns=None, progress=None, table_format=None,
+                          write_xlsx=True, sheet_names=None):
+    """Traite un classeur d'une nomenclature par feuille (toutes, ou `sheet_names`).
+
+    Chaque feuille est complétée avec les rapports portant son nom, sinon
+    avec les rapports communs, sur un pool de threads ; le classeur produit
+    conserve les feuilles et partage un seul onglet Liste. Avec
+    `table_format`, toutes les feuilles sont écrites dans une même table
+    (colonne FEUILLE).
+    """
+    progress = progress or (lambda stage, done=None, total=None: None)
+    progress("Lecture de la nomenclature")
+    with metrics.stage("nomenclature"):
+        sheets = read_excel_sheets(bom_path, sheet_names)
+    if not sheets:
+        raise BatchError("aucune feuille à traiter dans le classeur")
+
+    assignments = {name: tuple(positions) for name, positions in sheet_reports(list(sheets), report_paths).items()}
+    report_data_by_group = {}
+    with metrics.stage("rapport"):
+        # Les rapports communs ne sont analysés qu'une fois pour toutes les feuilles qui les utilisent
+        for group in dict.fromkeys(assignments.values()):
+            if group:
+                report_data_by_group[group] = _read_report_paths(
+                    [report_paths[position] for position in group], report_workers, policy, progress)
+    if not any(has_report_data(report_data) for report_data in report_data_by_group.values()):
+        raise BatchError("aucune donnée trouvée dans les rapports")
+
+    if history_path:
+        progress("Historique")
+        with metrics.stage("historique"):
+            for name, group in assignments.items():
+                # Les feuilles sans colonne COMP. (notes, sommaire) ne sont pas des cartes
+                if group and "COMP." in sheets[name].columns:
+                    paths = [report_paths[position] for position in group]
+                    record_run(report_data_by_group[group], f"{board_name(bom_path)} - {name}",
+                               _reports_hash(paths, policy), ", ".join(os.path.basename(path) for path in paths),
+                               path=history_path)
+
+    with metrics.stage("jointure"):
+        results = complete_sheets(sheets, {name: report_data_by_group.get(group) for name, group in assignments.items()},
+                                  progress=lambda done, total: progress("Jointure des feuilles", done, total))
+
+    outputs = []
+    if write_xlsx:
+        outputs.append(output_path)
+        with metrics.stage("export"):
+            _write_atomic(output_path, lambda output: export_workbook(
+                {name: (result["df"], result["format_info"]) for name, result in results.items()}, output,
+                dropdown_columns=dropdown_columns, progress=lambda done, total: progress("Export Excel", done, total)))
+
+    if table_format:
+        progress("Export en colonnes")
+        with metrics.stage("colonnes"):
+            names = table_file_names(os.path.basename(bom_path), table_format)
+            path = os.path.join(os.path.dirname(output_path), names["nomenclature"])
+            _write_atomic(path, lambda output: write_table(columnar_frame(combined_frame(results)), output,
+                                                           table_format))
+            outputs.append(path)
+
+    # Repères sans correspondance préfixés du nom de leur feuille
+    unmatched = {side: [f"{name}/{designator}" for name, result in results.items()
+                        for designator in result["unmatched"][side]]
+                 for side in ("nomenclature", "report")}
+    return {"rows": sum(len(result["df"]) for result in results.values()),
+            "processed": sum(result["processed_count"] for result in results.values()),
+            "sheets": len(results), "outputs": outputs, "unmatched": unmatched, "timings": metrics.timings()}
+
+
+def _write_atomic(path, write):
+    # Écriture dans un fichier temporaire : un traitement interrompu ne laisse pas de fichier incomplet
+    temp_path = path + ".tmp"
+    try:
+        with open(temp_path, "wb") as output:
+            result = write(output)
+        os.replace(temp_path, path)
+        return result
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _reports_hash(report_paths, policy):
+    hashes = []
+    for path in report_paths:
+        with open(path, "rb") as report:
+            hashes.append(content_hash(report))
+    return combined_hash(hashes, policy)
+
+
+def _run_pair(pair, incremental=False, track_memory=False, report_workers=1, policy=DEFAULT_POLICY,
+              history_path=None, dropdown_columns=None, table_format=None, write_xlsx=True, sheet_names=None):
+    # Exécuté dans un processus du pool : les erreurs sont renvoyées sous forme de texte
+    bom_path, report_paths, output_path = pair
+    metrics = StageMetrics(track_memory=track_memory)
+    start = time.perf_counter()
+    try:
+        result = process_pair(bom_path, report_paths, output_path, incremental, metrics, report_workers, policy,
+                              history_path, dropdown_columns, table_format=table_format, write_xlsx=write_xlsx,
+                              sheet_names=sheet_names)
+        result["error"] = None
+    except Exception as e:
+        result = {"error": f"{e.__class__.__name__}: {e}", "traceback": traceback.format_exc()}
+    result["total"] = time.perf_counter() - start
+    result["stages"] = metrics.stages
+    return result
+
+
+def _output_path(bom_path, output_path, output_dir, incremental=False):
+    if output_path is not None:
+        return output_path
+    if incremental:
+        # Le classeur complété est mis à jour sur place, sauf dossier de sortie explicite
+        file_name = os.path.basename(bom_path)
+    else:
+        file_name = updated_file_name(os.path.basename(bom_path))
+    return os.path.join(output_dir or os.path.dirname(bom_path), file_name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Met à jour des nomenclatures avec leurs rapports de couverture.")
+    parser.add_argument("source", help="dossier de paires nomenclature/rapport ou manifeste CSV")
+    parser.add_argument("-o", "--output-dir", help="dossier des fichiers générés (par défaut, celui de la nomenclature)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="nombre de processus (défaut : nombre de cœurs)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="les nomenclatures sont des classeurs déjà complétés (_updated.xlsx) à mettre à jour sur place")
+    parser.add_argument("--merge", action="store_true",
+                        help="fusionner tous les rapports d'un dossier ne contenant qu'une nomenclature")
+    parser.add_argument("--policy", choices=list(MERGE_POLICIES), default=DEFAULT_POLICY,
+                        help="règle de fusion de plusieurs rapports d'une même carte (défaut : %(default)s)")
+    parser.add_argument("--history", metavar="BASE",
+                        help="base SQLite où ajouter les statuts par composant de chaque carte traitée")
+    parser.add_argument("--dropdowns", metavar="FICHIER",
+                        help="valeurs des menus déroulants : JSON {colonne: [valeurs]} ou classeur avec un onglet Liste")
+    parser.add_argument("--tables", choices=list(TABLE_FORMATS),
+                        help="écrire aussi la nomenclature complétée et la table du rapport dans ce format (analyses)")
+    parser.add_argument("--no-xlsx", action="store_true",
+                        help="mode rapide : ne produire que les tables de --tables, sans classeur Excel formaté")
+    parser.add_argument("--sheets", nargs="?", const=ALL_SHEETS, metavar="FEUILLES",
+                        help="classeurs d'une nomenclature par feuille : toutes les feuilles, ou celles listées "
+                             "(séparées par des virgules) ; chaque feuille utilise le rapport portant son nom, "
+                             "sinon les rapports communs")
+    parser.add_argument("--metrics", help="fichier JSON où enregistrer durée, temps CPU et pic mémoire de chaque étape")
+    parser.add_argument("-v", "--verbose", action="store_true", help="afficher la trace complète des erreurs et les composants sans correspondance")
+    args = parser.parse_args(argv)
+    if args.no_xlsx and not args.tables:
+        parser.error("--no-xlsx nécessite --tables")
+    if args.incremental and args.tables:
+        parser.error("--tables ne s'applique pas au mode --incremental")
+    if args.incremental and args.sheets:
+        parser.error("--sheets ne s'applique pas au mode --incremental")
+    sheet_names = args.sheets
+    if sheet_names not in (None, ALL_SHEETS):
+        sheet_names = [name.strip() for name in sheet_names.split(",") if name.strip()]
+
+    try:
+        if os.path.isdir(args.source):
+            # Un classeur de plusieurs feuilles est associé à tous les rapports de son dossier
+            pairs = find_pairs(args.source, args.incremental, args.merge or sheet_names is not None)
+        else:
+            pairs = read_manifest(args.source)
+    except (OSError, BatchError) as e:
+        print(f"Erreur: {e}", file=sys.stderr)
+        return 2
+    if not pairs:
+        print(f"Aucune paire nomenclature/rapport trouvée dans {args.source}", file=sys.stderr)
+        return 2
+
+    dropdown_columns = None
+    if args.dropdowns:
+        try:
+            dropdown_columns = load_dropdown_columns(args.dropdowns)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Erreur: menus déroulants illisibles ({args.dropdowns}): {e}", file=sys.stderr)
+            return 2
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    pairs = [
+        (bom_path, report_paths, _output_path(bom_path, output_path, args.output_dir, args.incremental))
+        for bom_path, report_paths, output_path in pairs
+    ]
+
+    start = time.perf_counter()
+    failures = 0
+    measurements = []
+    # Le suivi mémoire ralentit le traitement : il n'est actif qu'avec --metrics
+    track_memory = args.metrics is not None
+    # Une seule paire : les processus servent à analyser son ou ses rapports
+    report_workers = args.jobs if len(pairs) == 1 else 1
+    with ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(pairs)))) as executor:
+        futures = {
+            executor.submit(_run_pair, pair, args.incremental, track_memory, report_workers, args.policy,
+                            args.history, dropdown_columns, args.tables, not args.no_xlsx, sheet_names): pair
+            for pair in pairs
+        }
+        for future in as_completed(futures):
+            bom_path, report_paths, output_path = futures[future]
+            result = future.result()
+            measurements.append({
+                "bom": bom_path,
+                "reports": report_paths,
+                "output": output_path,
+                "error": result["error"],
+                "total": result["total"],
+                "stages": result["stages"],
+            })
+            if result["error"] is not None:
+                failures += 1
+                print(f"ÉCHEC  {bom_path} + {' + '.join(report_paths)} ({result['total']:.2f} s): {result['error']}")
+                if args.verbose:
+                    print(result["traceback"])
+                continue
+            stages = "  ".join(f"{stage} {duration:.2f} s" for stage, duration in result["timings"].items())
+            if args.incremental:
+                summary = f"{result['changes']} cellule(s) modifiée(s)"
+            else:
+                summary = f"{result['processed']} composants traités sur {result['rows']} lignes"
+                if "sheets" in result:
+                    summary += f" de {result['sheets']} feuille(s)"
+                report_only = result["unmatched"]["report"]
+                if report_only:
+                    summary += f", {len(report_only)} composant(s) du rapport absent(s) de la nomenclature"
+                output_path = ", ".join(result["outputs"])
+            print(f"OK     {output_path} ({result['total']:.2f} s: {stages}) {summary}")
+            if args.verbose and not args.incremental:
+                for side, label in (("report", "Absents de la nomenclature"), ("nomenclature", "Absents du rapport")):
+                    if result["unmatched"][side]:
+                        print(f"       {label}: {', '.join(result['unmatched'][side])}")
+
+    elapsed = time.perf_counter() - start
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as metrics_file:
+            json.dump({"elapsed": elapsed, "jobs": args.jobs, "pairs": measurements}, metrics_file, indent=2, ensure_ascii=False)
+    print(f"Terminé en {elapsed:.2f} s : {len(pairs) - failures} réussi(s), {failures} échec(s) sur {len(pairs)} paire(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
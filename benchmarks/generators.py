@@ -0,0 +1,115 @@
+"""Générateurs de rapports et de nomenclatures synthétiques pour les mesures de performance.
+
+Les fichiers produits reprennent la structure des fichiers réels : blocs
+"Test Summary for ... Totals: xx.xx%", blocs "*XXX Units ... PASS/FAIL",
+section "Untested Devices" et nomenclature CSV sans en-tête à 9 colonnes.
+"""
+import random
+
+# Préfixes de composants, types de nomenclature et références associés
+COMPONENT_KINDS = [
+    ("U", "LOGIC", ["CD4013BF", "CD4050BE", "MC14519", "SNJ55189AJ"]),
+    ("C", "CAP", ["10N", "470P", "1U", "47N"]),
+    ("R", "RES", ["10K", "4.7K", "100", "1M"]),
+    ("D", "DIODE", ["1N4148", "1N5819", "BZX84", "BAS16"]),
+    ("Q", "NPN", ["2N2222", "BC847", "2N3904", "BC337"]),
+    ("L", "IND", ["10U", "4.7U", "100U", "1M"]),
+]
+
+SUMMARY_BLOCK = """Test Summary for {component} ({part})
+Type                Tested Faults        Detected         Coverage
+------------------------------------------------------------------
+Inputs:    8               8                 {detected}             {coverage:6.2f}%
+Outputs:   4               8                 8             100.00%
+Other:     2    (VCC: 1  GND: 1  UNUSED: 0)
+--------------------------------------------------------------------
+Totals:   14              16                {detected}             {coverage:6.2f}%
+====================================================================
+
+
+
+"""
+
+UNITS_BLOCK = """-----------------------------------------------------------------------
+ Test Summary for: {component}    (129595 )
+                                      Hi tol = 28.35P   Lo tol = 25.65P
+
+*{test_id:<20} Units = Farads  Hi lim = 751P     Lo lim = 55P
+*       min|mean|max = {{ 69.41P | 69.671P | 70P }}
+        std dev = 3.008E-13   cp = 385.6  cpk = 16.3   proximity = -95.8%
+*       {result}  EDGE   LBF   (Default Quality Criteria used)
+"""
+
+NOTEST_LINE = "{component:>17}  (COMPONENT IS TESTED IN PARALLEL WITH {tested_with})   NOTEST   \n"
+PMSG_LINE = "{component:>17}  (PMSG is not used)   \n"
+
+
+def component_names(count):
+    """Désignateurs uniques (U1, C2, R3...) répartis entre les familles de composants."""
+    names = []
+    for index in range(count):
+        prefix, _, _ = COMPONENT_KINDS[index % len(COMPONENT_KINDS)]
+        names.append(f"{prefix}{index // len(COMPONENT_KINDS) + 1}")
+    return names
+
+
+def write_report(stream, count, seed=0):
+    """Écrit un rapport synthétique couvrant `count` composants dans un flux binaire.
+
+    Les circuits logiques ont un bloc de couverture, les autres composants un
+    ou plusieurs blocs de mesure, et une partie d'entre eux figure dans la
+    section "Untested Devices" (NOTEST ou PMSG not used).
+    """
+    rng = random.Random(seed)
+    untested = []
+    chunk = []
+
+    def flush(force=False):
+        if force or len(chunk) >= 1000:
+            stream.write("".join(chunk).encode("utf-8"))
+            chunk.clear()
+
+    chunk.append("ANALYZE REPORT\n" + "=" * 74 + "\n\n")
+    for index, component in enumerate(component_names(count)):
+        _, _, parts = COMPONENT_KINDS[index % len(COMPONENT_KINDS)]
+        draw = rng.random()
+        if component.startswith("U"):
+            detected = rng.choice([8, 8, 8, 6, 4])
+            chunk.append(SUMMARY_BLOCK.format(
+                component=component, part=rng.choice(parts),
+                detected=detected + 8, coverage=(detected + 8) / 16 * 100,
+            ))
+        elif draw < 0.1:
+            untested.append(NOTEST_LINE.format(component=component, tested_with=f"C{rng.randint(1, count)}"))
+        elif draw < 0.15:
+            untested.append(PMSG_LINE.format(component=component))
+        else:
+            # Un composant sur cinq a plusieurs tests : il ne compte pas comme test unique PASS
+            test_count = 2 if draw > 0.8 else 1
+            for test in range(test_count):
+                test_id = component if test == 0 else f"{component}_PRESENCE"
+                result = "PASS" if rng.random() > 0.05 else "FAIL"
+                chunk.append(UNITS_BLOCK.format(component=component, test_id=test_id, result=result))
+        flush()
+
+    chunk.append("\n\nANALYZE General Summary Report\n\n\n\nUntested Devices\n----------------\n")
+    chunk.extend(untested)
+    flush(force=True)
+
+
+def write_bom(stream, count, seed=0):
+    """Écrit une nomenclature CSV sans en-tête à 9 colonnes (COMP., TYPE, VAL, TOL, STYLE, P/N,
+    DESCRIPTION, LETTRE, CHIFFRE) dans un flux binaire."""
+    rng = random.Random(seed)
+    chunk = []
+    for index, component in enumerate(component_names(count)):
+        prefix, bom_type, parts = COMPONENT_KINDS[index % len(COMPONENT_KINDS)]
+        value = rng.choice(parts)
+        part_number = rng.randint(100000, 999999)
+        description = f"{part_number} @ {component} - {bom_type}/{value}"
+        number = component[len(prefix):]
+        chunk.append(f"{component},{bom_type},{value},{rng.choice([5, 10, 20])},,{part_number},{description},{prefix},{number}\n")
+        if len(chunk) >= 1000:
+            stream.write("".join(chunk).encode("utf-8"))
+            chunk.clear()
+    stream.write("".join(chunk).encode("utf-8"))
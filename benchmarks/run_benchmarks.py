@@ -0,0 +1,164 @@
+"""Mesure des étapes du traitement sur des fichiers synthétiques.
+
+Exemples (depuis la racine du dépôt) :
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --sizes 1000,10000 --repeat 5
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/ancien.json
+
+Chaque exécution est enregistrée en JSON (versions, machine, durées par
+étape et par taille) pour suivre les régressions d'une version à l'autre.
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from benchmarks.generators import write_bom, write_report
+from bom_loader import read_nomenclature
+from completion import apply_report_data
+from excel_export import export_nomenclature
+from ingestion import parse_report_parallel
+from report_parser import extract_data_from_report
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "inconnu"
+
+
+def _time(function, repeat):
+    durations = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start)
+    return durations, result
+
+
+def run_size(count, repeat, work_dir, seed=0):
+    """Génère les fichiers pour `count` composants puis chronomètre chaque étape."""
+    report_path = os.path.join(work_dir, f"report_{count}.txt")
+    bom_path = os.path.join(work_dir, f"bom_{count}.csv")
+    with open(report_path, "wb") as stream:
+        write_report(stream, count, seed)
+    with open(bom_path, "wb") as stream:
+        write_bom(stream, count, seed)
+
+    def extract():
+        with open(report_path, "rb") as text_file:
+            return extract_data_from_report(text_file)
+
+    def extract_parallel():
+        return parse_report_parallel(report_path)
+
+    def update():
+        with open(bom_path, "rb") as excel_file:
+            df = read_nomenclature(excel_file)
+        return apply_report_data(df, report_data)
+
+    def export():
+        return export_nomenclature(df, format_info, io.BytesIO())
+
+    results = []
+    durations, report_data = _time(extract, repeat)
+    results.append(("extract_data_from_report", durations))
+    durations, _ = _time(extract_parallel, repeat)
+    results.append(("parse_report_parallel", durations))
+    durations, (df, format_info, _) = _time(update, repeat)
+    results.append(("update_excel_with_data", durations))
+    durations, _ = _time(export, repeat)
+    results.append(("export_nomenclature", durations))
+
+    sizes = {"report_bytes": os.path.getsize(report_path), "bom_bytes": os.path.getsize(bom_path), "rows": len(df)}
+    os.remove(report_path)
+    os.remove(bom_path)
+    return [
+        {
+            "components": count,
+            "stage": stage,
+            **sizes,
+            "seconds": durations,
+            "best": min(durations),
+            "median": statistics.median(durations),
+        }
+        for stage, durations in results
+    ]
+
+
+def compare(results, previous_path):
+    with open(previous_path, encoding="utf-8") as previous_file:
+        previous = json.load(previous_file)
+    previous_best = {(entry["components"], entry["stage"]): entry["best"] for entry in previous["results"]}
+    print(f"\nComparaison avec {previous_path} (version {previous.get('revision', '?')}) :")
+    for entry in results:
+        before = previous_best.get((entry["components"], entry["stage"]))
+        if before:
+            print(f"  {entry['components']:>9} {entry['stage']:<26} {before:8.3f} s -> {entry['best']:8.3f} s "
+                  f"(x{entry['best'] / before:.2f})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mesure les performances du traitement sur des fichiers synthétiques.")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="nombres de composants, séparés par des virgules")
+    parser.add_argument("--repeat", type=int, default=3, help="nombre de répétitions de chaque étape")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="fichier JSON des résultats (par défaut dans benchmarks/results/)")
+    parser.add_argument("--compare", help="résultats JSON d'une exécution précédente à comparer")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    revision = _git_revision()
+    all_results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for count in sizes:
+            results = run_size(count, args.repeat, work_dir, args.seed)
+            for entry in results:
+                print(f"{count:>9} composants  {entry['stage']:<26} meilleur {entry['best']:8.3f} s  "
+                      f"médiane {entry['median']:8.3f} s")
+            all_results.extend(results)
+
+    run = {
+        "revision": revision,
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "packages": {"pandas": pd.__version__, "numpy": np.__version__, "openpyxl": openpyxl.__version__},
+        "repeat": args.repeat,
+        "results": all_results,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{datetime.date.today():%Y%m%d}_{revision}.json")
+    with open(output, "w", encoding="utf-8") as output_file:
+        json.dump(run, output_file, indent=2)
+    print(f"Résultats enregistrés dans {output}")
+
+    if args.compare:
+        compare(all_results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
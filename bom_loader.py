@@ -0,0 +1,147 @@
+import os
+from importlib.util import find_spec
+
+import pandas as pd
+
+# Colonnes du format CSV sans en-tête (export de la nomenclature) et ordre des colonnes complétées
+HEADERLESS_COLUMNS = ['COMP.', 'TYPE', 'VAL', 'TOL', 'STYLE', 'P/N', 'DESCRIPTION', 'LETTRE', 'CHIFFRE']
+ORDERED_COLUMNS = ['COMP.', 'TYPE', 'STYLE', 'VAL', 'TOL', 'BIBLIO', 'P/N', 'DESCRIPTION',
+                   'STRATEGIE', 'STRUCTURAL', 'PPVS', 'COVERAGE %', 'REMARKS']
+
+# Types imposés aux colonnes connues : identifiants en texte (zéros initiaux des P/N conservés),
+# colonnes à faible nombre de valeurs distinctes en catégories
+TEXT_COLUMNS = ['COMP.', 'VAL', 'P/N', 'DESCRIPTION']
+CATEGORY_COLUMNS = ['TYPE', 'STYLE']
+COLUMN_DTYPES = {**{column: str for column in TEXT_COLUMNS}, **{column: "category" for column in CATEGORY_COLUMNS}}
+
+# Onglets ajoutés par l'export et la mise à jour incrémentale, ignorés à la lecture de toutes les feuilles
+GENERATED_SHEETS = ["Liste", "Modifications"]
+
+# Lecteurs rapides utilisés lorsqu'ils sont installés (python-calamine, pyarrow)
+EXCEL_ENGINE = "calamine" if find_spec("python_calamine") else "openpyxl"
+HAS_PYARROW = find_spec("pyarrow") is not None
+
+
+def _source_name(source):
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    return getattr(source, "name", "")
+
+
+def _is_headerless_csv(source):
+    # Lire la première ligne pour vérifier si le fichier a un en-tête
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as file:
+            first_line = file.readline().decode('utf-8', errors='ignore')
+    else:
+        source.seek(0)
+        first_line = source.readline().decode('utf-8', errors='ignore')
+        source.seek(0)
+    return bool(first_line) and not 'COMP.' in first_line and ',' in first_line
+
+
+def _read_headerless_pyarrow(source, columns):
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+
+    table = pa_csv.read_csv(
+        source,
+        read_options=pa_csv.ReadOptions(column_names=HEADERLESS_COLUMNS),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=columns,
+            column_types={column: pa.string() for column in TEXT_COLUMNS + CATEGORY_COLUMNS},
+            strings_can_be_null=True,
+        ),
+    )
+    df = table.to_pandas()
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+    return df
+
+
+def _read_headerless_csv(source, usecols=None):
+    # LETTRE et CHIFFRE ne sont pas conservées : elles ne sont pas lues
+    columns = [column for column in HEADERLESS_COLUMNS[:7] if usecols is None or column in usecols]
+    df = None
+    if HAS_PYARROW:
+        try:
+            df = _read_headerless_pyarrow(source, columns)
+        except Exception:
+            # Lignes irrégulières ou encodage non UTF-8 : lecture par pandas, plus tolérante
+            df = None
+            if not isinstance(source, (str, os.PathLike)):
+                source.seek(0)
+    if df is None:
+        df = pd.read_csv(source, header=None, names=HEADERLESS_COLUMNS, usecols=columns,
+                         dtype={column: dtype for column, dtype in COLUMN_DTYPES.items() if column in columns})
+
+    # Ajouter les colonnes manquantes et réordonner selon le format demandé
+    for col in ORDERED_COLUMNS:
+        if col not in df.columns:
+            df[col] = None
+    ordered = [col for col in ORDERED_COLUMNS if usecols is None or col in usecols]
+    return df[ordered]
+
+
+def _drop_trailing_empty_rows(df):
+    # calamine conserve les lignes vides mises en forme en fin de feuille, contrairement à openpyxl
+    filled = df.notna().any(axis=1).to_numpy()
+    if filled.all():
+        return df
+    last_filled = filled.nonzero()[0]
+    return df.iloc[:last_filled[-1] + 1 if len(last_filled) else 0]
+
+
+def read_excel_sheet(source, sheet_name=0, usecols=None):
+    """Lit une feuille Excel avec le lecteur le plus rapide disponible et les types imposés."""
+    df = pd.read_excel(source, sheet_name=sheet_name, engine=EXCEL_ENGINE, usecols=usecols, dtype=COLUMN_DTYPES)
+    if EXCEL_ENGINE == "calamine":
+        df = _drop_trailing_empty_rows(df)
+    return df
+
+
+def excel_sheet_names(source):
+    """Noms des feuilles d'un classeur, sans lire leur contenu."""
+    with pd.ExcelFile(source, engine=EXCEL_ENGINE) as workbook:
+        names = list(workbook.sheet_names)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return names
+
+
+def read_excel_sheets(source, sheet_names=None, usecols=None):
+    """Lit plusieurs feuilles d'un classeur en une seule ouverture ; retourne {feuille: DataFrame}.
+
+    Sans `sheet_names`, toutes les feuilles sont lues, sauf les onglets
+    produits par l'export (Liste, Modifications).
+    """
+    with pd.ExcelFile(source, engine=EXCEL_ENGINE) as workbook:
+        names = sheet_names if sheet_names is not None else [
+            name for name in workbook.sheet_names if name not in GENERATED_SHEETS]
+        missing = [name for name in names if name not in workbook.sheet_names]
+        if missing:
+            raise ValueError(f"Feuille(s) introuvable(s): {', '.join(missing)}")
+        sheets = {}
+        for name in names:
+            df = workbook.parse(name, usecols=usecols, dtype=COLUMN_DTYPES)
+            if EXCEL_ENGINE == "calamine":
+                df = _drop_trailing_empty_rows(df)
+            sheets[name] = df
+    return sheets
+
+
+def read_nomenclature(source, usecols=None):
+    """Lit la nomenclature (Excel ou CSV) depuis un chemin ou un fichier ouvert en binaire muni d'un attribut `name`.
+
+    `usecols` limite la lecture aux colonnes utiles à l'appelant ; par défaut
+    toutes les colonnes reprises dans le fichier complété sont lues.
+    """
+    if _source_name(source).endswith('.csv'):
+        # Nomenclature sans en-tête (format spécial) ou CSV standard avec en-tête
+        if _is_headerless_csv(source):
+            return _read_headerless_csv(source, usecols)
+        return pd.read_csv(source, usecols=usecols, dtype=COLUMN_DTYPES)
+
+    # Fichier Excel standard
+    return read_excel_sheet(source, usecols=usecols)
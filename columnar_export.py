@@ -0,0 +1,103 @@
+"""Export en colonnes (Parquet, Arrow IPC, CSV) de la nomenclature complétée et du rapport analysé.
+
+Aucun style n'est calculé : les tables sont écrites directement à partir
+des DataFrames, avec la couverture en fraction numérique comme dans le
+classeur. Parquet et Arrow nécessitent pyarrow ; CSV est toujours disponible.
+"""
+import io
+import os
+
+import pandas as pd
+
+from bom_loader import HAS_PYARROW
+from completion import build_status_frame, component_statuses
+
+# Format -> extension des fichiers produits
+TABLE_FORMATS = {"parquet": ".parquet", "arrow": ".arrow", "csv": ".csv"}
+TABLE_MIME_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+    "csv": "text/csv",
+}
+
+
+def _coverage_fraction(values):
+    # "87.50%" -> 0.875 ; les nombres sont conservés, le reste devient manquant
+    text = values.astype(str).str.strip()
+    numeric = pd.to_numeric(text.str.rstrip("%"), errors="coerce")
+    return numeric.where(~text.str.endswith("%"), numeric / 100)
+
+
+def columnar_frame(df):
+    """DataFrame prêt pour Arrow : couverture numérique, colonnes de types mélangés en texte."""
+    df = df.copy()
+    for column in df.columns:
+        if column == "COVERAGE %":
+            df[column] = _coverage_fraction(df[column])
+            continue
+        if df[column].dtype != object:
+            continue
+        values = df[column].infer_objects()
+        if values.dtype == object and pd.api.types.infer_dtype(values, skipna=True) not in ("string", "empty"):
+            # Arrow exige un seul type par colonne : nombres et textes saisis à la main deviennent du texte
+            values = values.astype(str).where(values.notna(), None)
+        df[column] = values
+    return df
+
+
+def report_table(report_data):
+    """Une ligne par composant cité par le rapport : sources brutes et statut retenu."""
+    status = build_status_frame(report_data)
+    resolved = component_statuses(report_data)
+    table = pd.DataFrame({
+        "COMP.": status.index.astype(str),
+        "coverage": status["coverage"].to_numpy() / 100,
+        "notest": status["notest"].to_numpy(),
+        "pmsg_not_used": status["pmsg"].to_numpy(),
+        "pass": status["pass"].to_numpy(),
+        "PPVS": resolved["PPVS"].to_numpy(),
+        "REMARKS": resolved["REMARKS"].to_numpy(),
+    })
+    return table.sort_values("COMP.", kind="stable").reset_index(drop=True)
+
+
+def write_table(df, output, table_format):
+    """Écrit `df` dans un chemin ou un flux binaire au format demandé."""
+    if table_format not in TABLE_FORMATS:
+        raise ValueError(f"Format inconnu: {table_format} (possibles: {', '.join(TABLE_FORMATS)})")
+    if table_format == "csv":
+        df.to_csv(output, index=False, encoding="utf-8")
+        return
+    if not HAS_PYARROW:
+        raise RuntimeError(f"Le format {table_format} nécessite pyarrow (pip install pyarrow)")
+    import pyarrow as pa
+    from pyarrow import feather
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if table_format == "parquet":
+        from pyarrow import parquet
+        parquet.write_table(table, output)
+    else:
+        # Format de fichier Arrow IPC (Feather v2), lisible sans copie par pyarrow.ipc / pd.read_feather
+        feather.write_feather(table, output)
+
+
+def table_bytes(df, table_format):
+    output = io.BytesIO()
+    write_table(df, output, table_format)
+    return output.getvalue()
+
+
+def export_tables(df, report_data, table_format):
+    """Nomenclature complétée et table du rapport, en octets, sans passer par openpyxl."""
+    return {
+        "nomenclature": table_bytes(columnar_frame(df), table_format),
+        "report": table_bytes(report_table(report_data), table_format),
+    }
+
+
+def table_file_names(excel_name, table_format):
+    # "carte.xlsx" -> "carte_updated.parquet" et "carte_report.parquet"
+    stem = os.path.splitext(excel_name)[0]
+    extension = TABLE_FORMATS[table_format]
+    return {"nomenclature": f"{stem}_updated{extension}", "report": f"{stem}_report{extension}"}
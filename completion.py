@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+
+from component_index import ComponentIndex, normalize_designators
+
+# Statuts PPVS et couleurs associées, par ordre de priorité décroissante :
+# couverture > NOTEST (SOUS-TEST) > PMSG not used (NOTEST) > test unique PASS
+STATUS_PPVS = ["OK", "SOUS-TEST", "NOTEST", "OK"]
+STATUS_COLORS = ["green", "yellow", "red", "green"]
+# Rang de chaque source (couverture, NOTEST, PMSG, PASS) pour une ligne de plusieurs composants :
+# le plus petit rang l'emporte. Un repère absent du rapport compte comme une couverture de 0 %
+SEVERITY = np.array([2, 1, 0, 3])
+
+
+def has_report_data(report_data):
+    return bool(report_data["coverage"] or report_data["notest"]
+                or report_data["pmsg_not_used"] or report_data.get("pass_tests", {}))
+
+
+def report_components(report_data):
+    # Composants cités par le rapport, toutes sources confondues
+    components = dict.fromkeys(report_data["coverage"])
+    components.update(dict.fromkeys(report_data["notest"]))
+    components.update(dict.fromkeys(report_data["pmsg_not_used"]))
+    components.update(dict.fromkeys(report_data.get("pass_tests", {})))
+    return list(components)
+
+
+def build_status_frame(report_data):
+    """Construit la table des statuts du rapport, indexée par composant.
+
+    Colonnes : "coverage" (float), "notest" (commentaire), "pmsg" et "pass"
+    (booléens). La priorité entre ces sources est appliquée lors de la jointure.
+    """
+    pmsg_components = pd.unique(pd.Series(report_data["pmsg_not_used"], dtype=object))
+    pass_components = list(report_data.get("pass_tests", {}))
+
+    status = pd.DataFrame({
+        "coverage": pd.Series(report_data["coverage"], dtype=float),
+        "notest": pd.Series(report_data["notest"], dtype=object),
+        "pmsg": pd.Series(True, index=pmsg_components, dtype=bool),
+        "pass": pd.Series(True, index=pass_components, dtype=bool),
+    })
+    status["pmsg"] = status["pmsg"].eq(True)
+    status["pass"] = status["pass"].eq(True)
+    return status
+
+
+def component_statuses(report_data):
+    """Statut de chaque composant cité par le rapport, sans nomenclature.
+
+    Retourne un DataFrame indexé par composant avec les colonnes
+    "COVERAGE %" (float, NaN sans couverture), "PPVS" et "REMARKS", selon
+    les mêmes priorités que `apply_report_data`.
+    """
+    status = build_status_frame(report_data)
+    has_coverage = status["coverage"].notna().to_numpy()
+    conditions = [has_coverage, status["notest"].notna().to_numpy(),
+                  status["pmsg"].to_numpy(), status["pass"].to_numpy()]
+    return pd.DataFrame({
+        "COVERAGE %": status["coverage"],
+        "PPVS": np.select(conditions, STATUS_PPVS, default=""),
+        "REMARKS": status["notest"].where(~has_coverage),
+    }, index=status.index)
+
+
+def normalized_status_frame(report_data):
+    """Table des statuts indexée par repère normalisé (premier composant retenu en cas de doublon)."""
+    status = build_status_frame(report_data)
+    status.index = normalize_designators(status.index.to_series())
+    return status[~status.index.duplicated()]
+
+
+def apply_report_data(df, report_data, index=None):
+    """Reporte les statuts du rapport sur la nomenclature en une seule passe vectorisée.
+
+    Les composants sont associés par repère normalisé via `index` (construit
+    à partir de la colonne COMP. s'il n'est pas fourni). Une ligne citant
+    plusieurs composants prend le statut le plus défavorable d'entre eux :
+    NOTEST, puis SOUS-TEST, puis la plus faible couverture, puis PASS ; dès
+    qu'un de ses repères figure dans le rapport, les autres comptent comme
+    une couverture de 0 %.
+    Retourne le DataFrame mis à jour, le tableau des couleurs PPVS par ligne
+    ("" pour les lignes non traitées) et le nombre de composants traités.
+    """
+    # S'assurer que les colonnes nécessaires existent
+    if "COVERAGE %" not in df.columns:
+        df["COVERAGE %"] = None
+    if "PPVS" not in df.columns:
+        df["PPVS"] = None
+    if "REMARKS" not in df.columns:
+        df["REMARKS"] = None
+
+    if "COMP." not in df.columns or len(df) == 0:
+        return df, np.full(len(df), "", dtype=object), 0
+
+    # Jointure de chaque repère de la nomenclature avec le statut de son composant
+    index = index if index is not None else ComponentIndex(df["COMP."])
+    aligned = normalized_status_frame(report_data).reindex(index.keys)
+
+    has_coverage = aligned["coverage"].notna().to_numpy()
+    conditions = [has_coverage, aligned["notest"].notna().to_numpy(),
+                  aligned["pmsg"].eq(True).to_numpy(), aligned["pass"].eq(True).to_numpy()]
+    # Source retenue pour chaque repère : 0 couverture, 1 NOTEST, 2 PMSG, 3 PASS, 4 absent du rapport
+    source = np.select(conditions, [0, 1, 2, 3], default=4)
+    reported = source < 4
+    coverage_values = aligned["coverage"].to_numpy()
+    notest_values = aligned["notest"].to_numpy()
+
+    if index.one_per_row:
+        chosen = np.arange(len(df))
+        row_source = source.copy()
+    else:
+        # Lignes dont au moins un repère figure dans le rapport ; leurs autres repères sont couverts à 0 %
+        cited = np.bincount(index.rows, weights=reported, minlength=len(df)) > 0
+        source = np.where(reported, source, 0)
+        coverage_values = np.where(reported, coverage_values, 0.0)
+        # Repère le plus défavorable de chaque ligne : PMSG, NOTEST, couverture croissante, PASS
+        order = np.lexsort((np.nan_to_num(coverage_values, nan=np.inf), SEVERITY[source], index.rows))
+        first = order[np.r_[True, index.rows[order][1:] != index.rows[order][:-1]]] if len(order) else order
+        chosen = np.full(len(df), -1)
+        chosen[index.rows[first]] = first
+        chosen[~cited] = -1
+        row_source = np.full(len(df), 4)
+        row_source[chosen >= 0] = source[chosen[chosen >= 0]]
+
+    format_info = np.array(STATUS_COLORS + [""], dtype=object)[row_source]
+    matched = row_source < 4
+    ppvs = np.array(STATUS_PPVS + [""], dtype=object)[row_source]
+
+    # Seule la première condition vraie s'applique (priorité de np.select)
+    coverage_rows = row_source == 0
+    notest_rows = row_source == 1
+
+    coverage = df["COVERAGE %"].astype(object)
+    coverage[coverage_rows] = [f"{value:.2f}%" for value in coverage_values[chosen[coverage_rows]]]
+    df["COVERAGE %"] = coverage
+
+    ppvs_column = df["PPVS"].astype(object)
+    ppvs_column[matched] = ppvs[matched]
+    df["PPVS"] = ppvs_column
+
+    remarks = df["REMARKS"].astype(object)
+    remarks[notest_rows] = notest_values[chosen[notest_rows]]
+    df["REMARKS"] = remarks
+
+    processed_components = pd.unique(index.keys[reported])
+    return df, format_info, len(processed_components)
@@ -0,0 +1,118 @@
+"""Index des composants d'une nomenclature : repères normalisés et plages développées.
+
+Les repères sont comparés sans espaces, sans distinction de casse et sans
+zéros non significatifs ("u010 " = "U10"). Une cellule COMP. peut citer
+plusieurs composants : liste ("C3,C4,C7", "C3 C4") ou plage explicite
+("R1-R5") ; une broche ou un sous-repère ("J1-2") n'est pas développé. L'index est construit une fois par nomenclature : un tableau de
+repères normalisés et le numéro de ligne de chacun, que la jointure avec
+le rapport résout par table de hachage.
+"""
+import re
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+# Nombre maximal de repères d'une plage ; au-delà, la cellule est conservée telle quelle
+RANGE_LIMIT = 10000
+
+# Motif compatible avec le moteur d'expressions régulières d'Arrow (sans assertion arrière)
+LEADING_ZEROS = re.compile(r"(^|\D)0+(\d)")
+SEPARATORS = re.compile(r"[,;\s]+")
+# Préfixe répété des deux côtés : "R1-R5" est une plage, "J1-2" désigne la broche 2 de J1
+RANGE = re.compile(r"^([A-Z]+)(\d+)-\1(\d+)$")
+
+
+def normalize_designator(value):
+    # " u010" -> "U10"
+    return LEADING_ZEROS.sub(r"\1\2", str(value).strip().upper())
+
+
+def normalize_designators(values):
+    """Version vectorisée de `normalize_designator` pour une Series de textes."""
+    return values.astype(str).str.strip().str.upper().str.replace(LEADING_ZEROS.pattern, r"\1\2", regex=True)
+
+
+def expand_designators(cell):
+    """Repères cités par une cellule normalisée : listes séparées et plages développées."""
+    designators = []
+    for token in SEPARATORS.split(cell):
+        if not token:
+            continue
+        match = RANGE.match(token)
+        if match:
+            prefix, start, end = match.group(1), int(match.group(2)), int(match.group(3))
+            # "R5-R1" ou "J1-J1" ne sont pas des plages
+            if start < end and end - start < RANGE_LIMIT:
+                designators.extend(f"{prefix}{number}" for number in range(start, end + 1))
+                continue
+        designators.append(token)
+    return list(dict.fromkeys(designators))
+
+
+class ComponentIndex:
+    """Repères normalisés d'une colonne COMP. et numéro de ligne de chacun.
+
+    `keys[i]` est cité par la ligne `rows[i]` ; une ligne de plusieurs
+    composants apparaît une fois par repère, une cellule vide n'apparaît pas.
+    """
+
+    def __init__(self, components):
+        values = pd.Series(components, dtype=object).reset_index(drop=True)
+        self.row_count = len(values)
+        present = values.notna() & values.astype(str).str.strip().ne("")
+        normalized = normalize_designators(values[present])
+
+        # Cas courant : un seul repère par cellule, sans boucle Python
+        multiple = normalized.str.contains(r"[,;\s-]", regex=True).to_numpy(dtype=bool)
+        keys = [normalized[~multiple].to_numpy(dtype=object)]
+        rows = [normalized.index[~multiple].to_numpy(dtype=np.intp)]
+        expanded_keys = []
+        expanded_rows = []
+        for row, cell in normalized[multiple].items():
+            designators = expand_designators(cell)
+            expanded_keys.extend(designators)
+            expanded_rows.extend([row] * len(designators))
+        keys.append(np.array(expanded_keys, dtype=object))
+        rows.append(np.array(expanded_rows, dtype=np.intp))
+
+        self.keys = np.concatenate(keys)
+        self.rows = np.concatenate(rows)
+        # Une entrée par ligne, dans l'ordre : la jointure n'a pas à regrouper par ligne
+        self.one_per_row = len(self.rows) == self.row_count and bool(np.all(self.rows == np.arange(self.row_count)))
+        if not self.one_per_row:
+            order = np.argsort(self.rows, kind="stable")
+            self.keys = self.keys[order]
+            self.rows = self.rows[order]
+        self._designators = pd.Index(self.keys).unique()
+
+    def __len__(self):
+        return len(self.keys)
+
+    @cached_property
+    def rows_by_designator(self):
+        """Table de hachage repère normalisé -> numéros de lignes, construite à la première recherche."""
+        return pd.Series(self.rows).groupby(self.keys, sort=False).indices
+
+    def lookup(self, designator):
+        """Numéros des lignes citant `designator` (sous n'importe quelle forme)."""
+        rows = self.rows_by_designator.get(normalize_designator(designator))
+        return np.empty(0, dtype=np.intp) if rows is None else self.rows[rows]
+
+    def matching_rows(self, report_components):
+        """Lignes dont au moins un repère figure parmi `report_components`."""
+        normalized = pd.Index(normalize_designators(pd.Series(list(report_components), dtype=object)))
+        # Index objet : un Index de textes Arrow comparerait les repères un par un en Python
+        return np.unique(self.rows[pd.Index(self.keys, dtype=object).isin(normalized.astype(object))])
+
+    def unmatched(self, report_components):
+        """Repères absents de l'autre côté : (nomenclature seule, rapport seul).
+
+        Les repères de la nomenclature sont normalisés et dans l'ordre des
+        lignes ; ceux du rapport sont donnés tels qu'ils y figurent, triés.
+        """
+        report_components = pd.Series(list(report_components), dtype=object)
+        normalized = pd.Index(normalize_designators(report_components))
+        bom_only = self._designators[~self._designators.isin(normalized)]
+        report_only = report_components[~normalized.isin(self._designators)]
+        return list(bom_only), sorted(report_only.astype(str))
@@ -0,0 +1,501 @@
+import datetime
+import functools
+import io
+import json
+import math
+import os
+import zipfile
+from xml.sax.saxutils import escape
+
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.compat import safe_string
+from openpyxl.formatting.rule import CellIsRule
+from openpyxl.styles import PatternFill, Alignment, Font, Border, Side
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.datetime import to_excel
+from openpyxl.worksheet.datavalidation import DataValidation
+
+# Styles construits une seule fois et partagés par toutes les cellules
+HEADER_FONT = Font(bold=True, color="FFFFFF", name="Aptos Narrow", italic=True)  # Blanc, Aptos Narrow, Italique
+HEADER_FILL = PatternFill(start_color="00AA91", end_color="00AA91", fill_type="solid")  # Turquoise #00AA91
+CELL_FONT = Font(name="Aptos Narrow")
+CENTER = Alignment(horizontal='center')
+THIN_BORDER = Border(
+    left=Side(style='thin'),
+    right=Side(style='thin'),
+    top=Side(style='thin'),
+    bottom=Side(style='thin')
+)
+
+# Style de remplissage pour chaque couleur
+GREEN_FILL = PatternFill(start_color="92D050", end_color="92D050", fill_type="solid")  # Vert clair pour OK
+YELLOW_FILL = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")  # Jaune pour SOUS-TEST
+RED_FILL = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")  # Rouge pour NOTEST
+PPVS_FILLS = {"OK": GREEN_FILL, "SOUS-TEST": YELLOW_FILL, "NOTEST": RED_FILL}
+
+# Style pour les en-têtes de l'onglet Liste
+LISTE_HEADER_FILL = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+
+# Valeurs proposées dans les menus déroulants (onglet "Liste")
+DROPDOWN_COLUMNS = {
+    "TYPE": ["ANALOG", "CAP", "CONN", "DIODE", "FUSE", "HYBRID", "IND", "JUMPER", "LED",
+             "LOGIC", "NPN", "NFET", "NJFET", "OTHER", "PCAP", "PFET", "PJFET", "PNP",
+             "RES", "VRES", "ZENER"],
+    "STYLE": ["1N", "10N", "47N", "47P", "1U", "15U", "3.3U"],
+    "BIBLIO": ["Teradyne", "Adaptée", "NOUVEAU", "Sans"],
+    "STRATEGIE": ["Analog", "Analog PWR", "Hybride", "Logic", "Logic + PROG", "Cluster",
+                  "Mesure I", "Mesure V", "Mesure F", "Fonctionnel"],
+    "STRUCTURAL": ["Junction", "Capacitive", "Both"],
+    "PPVS": ["OK", "SOUS-TEST", "NOTEST"]
+}
+
+# Fichier JSON ({"colonne": [valeurs]}) ou classeur avec un onglet "Liste" remplaçant ces menus
+DROPDOWNS_PATH = os.environ.get("EXCEL_COMPLETER_DROPDOWNS")
+
+MIME_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Nombre de lignes de données sérialisées avant chaque écriture dans l'archive
+ROWS_PER_CHUNK = 1000
+NUMERIC_TYPES = (int, float)
+# Formats des dates écrites dans les cellules de données
+DATE_FORMATS = ("yyyy-mm-dd h:mm:ss", "yyyy-mm-dd")
+# Dernière ligne provisoire des plages (validations, formatage conditionnel) du modèle compilé
+ROW_SENTINEL = 1048576
+
+
+def _styled_cell(worksheet, font=CELL_FONT, fill=None, alignment=None, number_format=None, value=None):
+    cell = WriteOnlyCell(worksheet, value=value)
+    cell.font = font
+    cell.border = THIN_BORDER
+    if fill is not None:
+        cell.fill = fill
+    if alignment is not None:
+        cell.alignment = alignment
+    if number_format is not None:
+        cell.number_format = number_format
+    return cell
+
+
+def _style_id(worksheet, **style):
+    # Enregistre le style dans le classeur et retourne son index (attribut s="..." des cellules)
+    return _styled_cell(worksheet, **style).style_id
+
+
+def _column_values(series):
+    # Valeurs Python prêtes à écrire, les cellules vides (NaN, NA) devenant None
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def _coverage_values(values):
+    # "87.50%" -> 0.875 au format pourcentage ; les autres valeurs sont laissées telles quelles
+    converted = []
+    is_percent = []
+    for value in values:
+        if value and isinstance(value, str) and "%" in value:
+            try:
+                converted.append(float(value.replace("%", "")) / 100)
+                is_percent.append(True)
+                continue
+            except ValueError:
+                pass
+        converted.append(value)
+        is_percent.append(False)
+    return converted, is_percent
+
+
+def column_width(series, title):
+    # Longueur maximale dans la colonne, limitée entre 10 et 30 caractères
+    lengths = series.astype(str).str.len()
+    max_length = lengths.max() if len(lengths) else 0
+    if pd.isna(max_length):
+        max_length = 0
+    max_length = max(max_length, len(str(title)))
+    return min(max(max_length + 2, 10), 30)
+
+
+class RowStyles:
+    """Index des styles des cellules de données, enregistrés une seule fois par classeur."""
+
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+        self.data = _style_id(worksheet)
+        self.percent = _style_id(worksheet, alignment=CENTER, number_format='0.00%')
+        self.center = _style_id(worksheet, alignment=CENTER)
+        self._dates = {}
+
+    def date(self, number_format, plain=False):
+        # Les feuilles recopiées n'ont ni police ni bordure : seul le format de date est appliqué
+        if (number_format, plain) not in self._dates:
+            if plain:
+                cell = WriteOnlyCell(self.worksheet)
+                cell.number_format = number_format
+                self._dates[number_format, plain] = cell.style_id
+            else:
+                self._dates[number_format, plain] = _style_id(self.worksheet, number_format=number_format)
+        return self._dates[number_format, plain]
+
+
+def cell_xml(ref, value, style):
+    # Même conversion des valeurs qu'openpyxl (formules, booléens, dates), chaînes en ligne
+    if value is None:
+        return f'<c r="{ref}" s="{style}"/>'
+    if isinstance(value, str):
+        value = ILLEGAL_CHARACTERS_RE.sub("", value)
+        if len(value) > 1 and value.startswith("="):
+            return f'<c r="{ref}" s="{style}"><f>{escape(value[1:])}</f><v></v></c>'
+        return f'<c r="{ref}" s="{style}" t="inlineStr"><is><t xml:space="preserve">{escape(value)}</t></is></c>'
+    if isinstance(value, bool):
+        return f'<c r="{ref}" s="{style}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, NUMERIC_TYPES) and math.isfinite(value):
+        return f'<c r="{ref}" s="{style}" t="n"><v>{value}</v></c>'
+    return f'<c r="{ref}" s="{style}" t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>'
+
+
+def _prepare_columns(df, format_info, styles):
+    """Valeurs et index de style de chaque cellule de données, colonne par colonne.
+
+    Appelée avant l'enregistrement du classeur : tous les styles utilisés
+    (y compris ceux des dates) doivent déjà figurer dans sa feuille de styles.
+    Sans `format_info`, la feuille est recopiée sans mise en forme.
+    """
+    plain = format_info is None
+    columns = list(df.columns)
+    column_values = [_column_values(df[column]) for column in columns]
+    column_styles = [[0 if plain else styles.data] * len(df) for _ in columns]
+
+    # Les dates sont converties en numéro de série Excel avec le format par défaut d'openpyxl
+    for column, values, col_styles in zip(columns, column_values, column_styles):
+        if df[column].dtype.kind not in "OM":
+            continue
+        for row_idx, value in enumerate(values):
+            if isinstance(value, (datetime.datetime, datetime.date)) and not pd.isna(value):
+                number_format = "yyyy-mm-dd h:mm:ss" if isinstance(value, datetime.datetime) else "yyyy-mm-dd"
+                values[row_idx] = to_excel(value)
+                col_styles[row_idx] = styles.date(number_format, plain)
+
+    if plain:
+        return column_values, column_styles
+
+    if "COVERAGE %" in columns:
+        coverage_idx = columns.index("COVERAGE %")
+        column_values[coverage_idx], coverage_percent = _coverage_values(column_values[coverage_idx])
+        column_styles[coverage_idx] = [
+            styles.percent if is_percent else style
+            for style, is_percent in zip(column_styles[coverage_idx], coverage_percent)
+        ]
+
+    # Alignement centré des cellules PPVS traitées ; les couleurs viennent du formatage conditionnel
+    if "PPVS" in columns:
+        ppvs_idx = columns.index("PPVS")
+        column_styles[ppvs_idx] = [
+            styles.center if color else style
+            for style, color in zip(column_styles[ppvs_idx], format_info)
+        ]
+
+    return column_values, column_styles
+
+
+def _iter_rows_xml(column_values, column_styles, start_row=2):
+    """Produit le XML des lignes de données, par paquets de ROWS_PER_CHUNK lignes."""
+    letters = [get_column_letter(col_num) for col_num in range(1, len(column_values) + 1)]
+    chunk = []
+    for row_offset, (values, row_styles) in enumerate(zip(zip(*column_values), zip(*column_styles))):
+        row_number = start_row + row_offset
+        cells = "".join(
+            cell_xml(f"{letter}{row_number}", value, style)
+            for letter, value, style in zip(letters, values, row_styles)
+        )
+        chunk.append(f'<row r="{row_number}">{cells}</row>')
+        if len(chunk) >= ROWS_PER_CHUNK:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+
+def load_dropdown_columns(path):
+    """Lit les valeurs des menus déroulants depuis un fichier JSON ou l'onglet "Liste" d'un classeur.
+
+    Dans le classeur, la première ligne contient le nom des colonnes et les
+    lignes suivantes leurs valeurs ; les colonnes sans nom ou sans valeur
+    sont ignorées.
+    """
+    if path.lower().endswith(".json"):
+        with open(path, encoding="utf-8") as config:
+            return {str(column): [str(value) for value in values] for column, values in json.load(config).items()}
+
+    workbook = load_workbook(path, read_only=True)
+    try:
+        rows = list(workbook["Liste"].iter_rows(values_only=True))
+    finally:
+        workbook.close()
+    if not rows:
+        return {}
+    dropdown_columns = {}
+    for col_idx, name in enumerate(rows[0]):
+        if name is None or str(name).strip() == "":
+            continue
+        values = [
+            str(row[col_idx]) for row in rows[1:]
+            if col_idx < len(row) and row[col_idx] is not None and str(row[col_idx]).strip() != ""
+        ]
+        if values:
+            dropdown_columns[str(name)] = values
+    return dropdown_columns
+
+
+@functools.lru_cache(maxsize=None)
+def default_dropdown_columns():
+    # Menus configurés par EXCEL_COMPLETER_DROPDOWNS, sinon valeurs par défaut
+    if DROPDOWNS_PATH:
+        return load_dropdown_columns(DROPDOWNS_PATH)
+    return DROPDOWN_COLUMNS
+
+
+def write_liste_sheet(workbook, dropdown_columns=DROPDOWN_COLUMNS):
+    worksheet = workbook.create_sheet("Liste")
+
+    for col_idx, (col_name, values) in enumerate(dropdown_columns.items(), 1):
+        max_width = max(len(col_name), max(len(str(v)) for v in values) if values else 0)
+        worksheet.column_dimensions[get_column_letter(col_idx)].width = max_width + 4
+
+    worksheet.append([
+        _styled_cell(worksheet, font=HEADER_FONT, fill=LISTE_HEADER_FILL, alignment=CENTER, value=col_name)
+        for col_name in dropdown_columns
+    ])
+
+    # Les valeurs PPVS de l'onglet Liste reprennent les couleurs du formatage conditionnel
+    value_cells = {}
+    for col_name in dropdown_columns:
+        if col_name == "PPVS":
+            value_cells[col_name] = {
+                value: _styled_cell(worksheet, fill=fill, alignment=CENTER)
+                for value, fill in PPVS_FILLS.items()
+            }
+        else:
+            value_cells[col_name] = {}
+    plain_cells = [_styled_cell(worksheet) for _ in dropdown_columns]
+
+    max_rows = max((len(values) for values in dropdown_columns.values()), default=0)
+    for row_idx in range(max_rows):
+        row = []
+        for plain_cell, (col_name, values) in zip(plain_cells, dropdown_columns.items()):
+            if row_idx >= len(values):
+                row.append(None)
+                continue
+            cell = value_cells[col_name].get(values[row_idx], plain_cell)
+            cell.value = values[row_idx]
+            row.append(cell)
+        worksheet.append(row)
+
+    return worksheet
+
+
+def add_validations(worksheet, columns, row_count, dropdown_columns=DROPDOWN_COLUMNS):
+    # Menus déroulants pointant vers l'onglet Liste
+    for i, col_name in enumerate(dropdown_columns):
+        # Sans valeur, la plage Liste!$X$2:$X$1 serait lue comme X1:X2 et n'accepterait que l'en-tête
+        if col_name not in columns or not dropdown_columns[col_name]:
+            continue
+        col_letter = get_column_letter(columns.index(col_name) + 1)
+        list_col_letter = get_column_letter(i + 1)
+        max_row = len(dropdown_columns[col_name]) + 1
+        formula = f"Liste!${list_col_letter}$2:${list_col_letter}${max_row}"
+        cell_range = f"{col_letter}2:{col_letter}{row_count + 1}"
+
+        dv = DataValidation(type="list", formula1=formula, allow_blank=True)
+        dv.add(cell_range)
+        worksheet.data_validations.append(dv)
+
+        # La colonne PPVS change de couleur automatiquement selon sa valeur
+        if col_name == "PPVS":
+            for value, fill in PPVS_FILLS.items():
+                rule = CellIsRule(operator='equal', formula=[f'"{value}"'], stopIfTrue=True, fill=fill)
+                worksheet.conditional_formatting.add(cell_range, rule)
+
+
+def _with_progress(rows_xml, row_count, progress):
+    # Signale le nombre de lignes écrites après chaque paquet de ROWS_PER_CHUNK lignes
+    written = 0
+    for chunk in rows_xml:
+        yield chunk
+        written = min(written + ROWS_PER_CHUNK, row_count)
+        progress(written, row_count)
+
+
+class _SheetParts:
+    """XML fixe d'une feuille de données du modèle, découpé autour des lignes."""
+
+    def __init__(self, sheet_xml):
+        # Les largeurs se placent avant <sheetData>, les lignes juste avant sa fin
+        before_data, data_and_tail = sheet_xml.split(b"<sheetData>", 1)
+        header_rows, tail = data_and_tail.split(b"</sheetData>", 1)
+        self._prefix = before_data
+        self._header = b"<sheetData>" + header_rows
+        self._tail_parts = (b"</sheetData>" + tail).split(str(ROW_SENTINEL).encode("ascii"))
+
+    def head(self, widths):
+        if not widths:
+            return self._prefix + self._header
+        cols = "".join(
+            f'<col width="{safe_string(width)}" customWidth="1" min="{col_num}" max="{col_num}"/>'
+            for col_num, width in enumerate(widths, 1)
+        )
+        return self._prefix + f"<cols>{cols}</cols>".encode("ascii") + self._header
+
+    def tail(self, row_count):
+        # Plages des validations et du formatage conditionnel limitées aux lignes de données
+        last_row = str(max(row_count, 1) + 1).encode("ascii")
+        return last_row.join(self._tail_parts)
+
+
+class ExportTemplate:
+    """Partie fixe du classeur exporté, compilée une seule fois par jeu de feuilles et de colonnes.
+
+    `sheets` liste les feuilles de données (nom, colonnes, recopiée), dans
+    l'ordre du classeur ; les feuilles recopiées n'ont qu'un en-tête sans
+    style, sans validation ni largeur de colonne. Les en-têtes, les styles partagés (formats de date compris),
+    l'onglet Liste commun, les validations et le formatage conditionnel sont
+    produits par openpyxl puis conservés sous forme d'octets. Chaque export
+    n'y ajoute que les largeurs de colonnes, les lignes de données et la
+    dernière ligne des plages : son coût ne dépend plus que du nombre de lignes.
+    """
+
+    def __init__(self, sheets, dropdown_columns=DROPDOWN_COLUMNS):
+        self.sheets = [(sheet_name, list(columns), plain) for sheet_name, columns, plain in sheets]
+        workbook = Workbook(write_only=True)
+        header_alignment = Alignment(horizontal='center', vertical='center')
+        worksheets = []
+        for sheet_name, columns, plain in self.sheets:
+            worksheet = workbook.create_sheet(sheet_name)
+            if plain:
+                worksheet.append(columns)
+                worksheets.append(worksheet)
+                continue
+            worksheet.append([
+                _styled_cell(worksheet, font=HEADER_FONT, fill=HEADER_FILL, alignment=header_alignment, value=column)
+                for column in columns
+            ])
+            add_validations(worksheet, columns, ROW_SENTINEL - 1, dropdown_columns)
+            worksheets.append(worksheet)
+
+        # Les styles sont communs au classeur : tous ceux des cellules de données doivent
+        # figurer dans la feuille de styles enregistrée
+        self.styles = RowStyles(worksheets[0])
+        for number_format in DATE_FORMATS:
+            self.styles.date(number_format)
+            if any(plain for _, _, plain in self.sheets):
+                self.styles.date(number_format, plain=True)
+        write_liste_sheet(workbook, dropdown_columns)
+
+        skeleton = io.BytesIO()
+        workbook.save(skeleton)
+        self.sheet_paths = [worksheet.path.lstrip("/") for worksheet in worksheets]
+        with zipfile.ZipFile(skeleton) as source:
+            self.entries = [(item, source.read(item.filename)) for item in source.infolist()]
+        entries = dict((item.filename, data) for item, data in self.entries)
+        self._parts = {path: _SheetParts(entries[path]) for path in self.sheet_paths}
+
+    @property
+    def columns(self):
+        return self.sheets[0][1]
+
+    def write(self, output, sheets):
+        """Écrit le classeur complet dans `output`, les lignes étant compressées au fil de l'eau.
+
+        `sheets` donne, pour chaque feuille du modèle et dans le même ordre,
+        les largeurs de colonnes, le XML des lignes (itérable) et leur nombre.
+        """
+        contents = dict(zip(self.sheet_paths, sheets))
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as target:
+            for item, data in self.entries:
+                if item.filename not in contents:
+                    target.writestr(item, data)
+                    continue
+                parts = self._parts[item.filename]
+                widths, rows_xml, row_count = contents[item.filename]
+                with target.open(item.filename, "w", force_zip64=True) as sheet:
+                    sheet.write(parts.head(widths))
+                    for chunk in rows_xml:
+                        sheet.write(chunk.encode("utf-8"))
+                    sheet.write(parts.tail(row_count))
+
+
+@functools.lru_cache(maxsize=32)
+def _compiled_template(sheets, dropdown_items):
+    return ExportTemplate(sheets, {column: list(values) for column, values in dropdown_items})
+
+
+def get_export_template(columns, dropdown_columns=None, sheet_name="Nomenclature", plain_sheets=()):
+    """Modèle compilé pour ces colonnes et ces menus déroulants, mis en cache pour le processus.
+
+    `columns` peut aussi associer chaque nom de feuille à ses colonnes,
+    l'argument `sheet_name` étant alors ignoré ; les feuilles de
+    `plain_sheets` sont recopiées sans mise en forme.
+    """
+    if dropdown_columns is None:
+        dropdown_columns = default_dropdown_columns()
+    dropdown_items = tuple((column, tuple(values)) for column, values in dropdown_columns.items())
+    if isinstance(columns, dict):
+        sheets = tuple((name, tuple(sheet_columns), name in plain_sheets) for name, sheet_columns in columns.items())
+    else:
+        sheets = ((sheet_name, tuple(columns), False),)
+    return _compiled_template(sheets, dropdown_items)
+
+
+def updated_file_name(name):
+    # Nom du fichier de sortie : "<nom>_updated.xlsx"
+    if name.endswith('.csv'):
+        return name.replace('.csv', '_updated.xlsx')
+    return name.replace('.xlsx', '_updated.xlsx')
+
+
+def export_nomenclature(df, format_info, output=None, progress=None, dropdown_columns=None):
+    """Écrit la nomenclature formatée dans un classeur Excel en flux.
+
+    La partie fixe du classeur (en-tête, styles partagés, onglet Liste,
+    validations et formatage conditionnel) vient d'un modèle compilé une
+    seule fois pour ces colonnes ; les lignes de données sont générées
+    directement à partir des colonnes du DataFrame. `progress(lignes_écrites,
+    total)` est appelée au fil de l'écriture. Retourne le flux de sortie (un
+    BytesIO par défaut) repositionné au début.
+    """
+    return export_workbook({"Nomenclature": (df, format_info)}, output, progress, dropdown_columns)
+
+
+def export_workbook(sheets, output=None, progress=None, dropdown_columns=None):
+    """Écrit plusieurs nomenclatures formatées dans un même classeur, une feuille chacune.
+
+    `sheets` associe à chaque nom de feuille, dans l'ordre du classeur, le
+    DataFrame et ses couleurs PPVS par ligne ; une feuille sans couleurs
+    (None) est recopiée telle quelle, sans mise en forme ni menu déroulant.
+    Les feuilles partagent un seul onglet Liste et une seule feuille de
+    styles ; `progress(lignes_écrites, total)` compte les lignes de toutes
+    les feuilles.
+    """
+    if output is None:
+        output = io.BytesIO()
+
+    plain_sheets = tuple(name for name, (_, format_info) in sheets.items() if format_info is None)
+    template = get_export_template({name: df.columns for name, (df, _) in sheets.items()}, dropdown_columns,
+                                   plain_sheets=plain_sheets)
+    total = sum(len(df) for df, _ in sheets.values())
+    contents = []
+    written = 0
+    for df, format_info in sheets.values():
+        widths = None if format_info is None else [column_width(df[column], column) for column in df.columns]
+        column_values, column_styles = _prepare_columns(df, format_info, template.styles)
+        rows_xml = _iter_rows_xml(column_values, column_styles)
+        if progress is not None:
+            # Progression cumulée : les lignes des feuilles précédentes sont déjà écrites
+            rows_xml = _with_progress(rows_xml, len(df), lambda done, _, offset=written: progress(offset + done, total))
+        contents.append((widths, rows_xml, len(df)))
+        written += len(df)
+    template.write(output, contents)
+
+    if hasattr(output, "seek"):
+        output.seek(0)
+    return output
@@ -0,0 +1,172 @@
+"""Historique des résultats de couverture par composant, dans une base SQLite locale.
+
+Chaque traitement enregistre le statut de tous les composants cités par le
+rapport (couverture en fraction comme dans l'export en colonnes, PPVS,
+remarque), avec la carte, l'empreinte du rapport et la date. Les
+composants sont enregistrés et recherchés par repère normalisé. Les index sur (composant, traitement) et (PPVS) permettent de
+suivre un composant ou de lister les NOTEST de toutes les cartes sans
+relire les anciens rapports.
+"""
+import datetime
+import hashlib
+import os
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+
+from completion import component_statuses
+from component_index import normalize_designator, normalize_designators
+
+DEFAULT_HISTORY_PATH = os.environ.get("EXCEL_COMPLETER_HISTORY_DB", "coverage_history.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    board TEXT NOT NULL,
+    report_hash TEXT NOT NULL,
+    report_name TEXT,
+    created_at TEXT NOT NULL,
+    UNIQUE (board, report_hash)
+);
+CREATE INDEX IF NOT EXISTS runs_board ON runs (board, created_at);
+
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    component TEXT NOT NULL,
+    coverage REAL,
+    ppvs TEXT,
+    remarks TEXT,
+    PRIMARY KEY (run_id, component)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS results_component ON results (component, run_id);
+CREATE INDEX IF NOT EXISTS results_ppvs ON results (ppvs, run_id);
+"""
+# Version 1 : couverture en fraction (0.85) et non plus en pourcentage (85.0)
+SCHEMA_VERSION = 1
+
+
+def board_name(file_name):
+    # Nom de la carte déduit de la nomenclature : "carte.xlsx" ou "carte_updated.xlsx" -> "carte"
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    return stem[:-len("_updated")] if stem.endswith("_updated") else stem
+
+
+def combined_hash(hashes, policy):
+    # Empreinte d'un ensemble de rapports fusionnés : celle du rapport seul s'il n'y en a qu'un
+    if len(hashes) == 1:
+        return hashes[0]
+    return hashlib.sha256(";".join(list(hashes) + [policy]).encode("ascii")).hexdigest()
+
+
+def connect(path=DEFAULT_HISTORY_PATH):
+    """Ouvre la base (créée au besoin) ; une connexion par thread ou processus."""
+    connection = sqlite3.connect(path, timeout=30)
+    # WAL : les lectures ne bloquent pas les écritures des traitements simultanés
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("PRAGMA foreign_keys=ON")
+    connection.executescript(SCHEMA)
+    if connection.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        _migrate(connection)
+    return connection
+
+
+def _migrate(connection):
+    # Verrou d'écriture pris avant de relire la version : une base n'est convertie qu'une fois
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        if connection.execute("PRAGMA user_version").fetchone()[0] < 1:
+            connection.execute("UPDATE results SET coverage = coverage / 100 WHERE coverage IS NOT NULL")
+        connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+
+
+def record_run(report_data, board, report_hash, report_name=None, created_at=None, path=DEFAULT_HISTORY_PATH):
+    """Enregistre les statuts d'un rapport pour une carte et retourne l'identifiant du traitement.
+
+    Un même rapport déjà enregistré pour la carte n'est pas dupliqué.
+    """
+    statuses = component_statuses(report_data)
+    # Repères normalisés comme pour la jointure ; le premier composant est retenu en cas de doublon
+    statuses.index = normalize_designators(statuses.index.to_series())
+    statuses = statuses[~statuses.index.duplicated()]
+    created_at = created_at or datetime.datetime.now().isoformat(timespec="seconds")
+    rows = zip(
+        statuses.index,
+        (statuses["COVERAGE %"] / 100).astype(object).where(statuses["COVERAGE %"].notna(), None),
+        statuses["PPVS"],
+        statuses["REMARKS"].astype(object).where(statuses["REMARKS"].notna(), None),
+    )
+    with closing(connect(path)) as connection, connection:
+        existing = connection.execute(
+            "SELECT id FROM runs WHERE board = ? AND report_hash = ?", (board, report_hash)
+        ).fetchone()
+        if existing is not None:
+            return existing[0]
+        run_id = connection.execute(
+            "INSERT INTO runs (board, report_hash, report_name, created_at) VALUES (?, ?, ?, ?)",
+            (board, report_hash, report_name, created_at),
+        ).lastrowid
+        connection.executemany(
+            "INSERT INTO results (run_id, component, coverage, ppvs, remarks) VALUES (?, ?, ?, ?, ?)",
+            ((run_id, *row) for row in rows),
+        )
+    return run_id
+
+
+def _query(sql, params, path):
+    with closing(connect(path)) as connection:
+        return pd.read_sql_query(sql, connection, params=params)
+
+
+def list_runs(board=None, limit=100, path=DEFAULT_HISTORY_PATH):
+    where = "WHERE board = ?" if board else ""
+    params = (board, limit) if board else (limit,)
+    return _query(
+        f"SELECT id, board, report_name, report_hash, created_at FROM runs {where} "
+        "ORDER BY created_at DESC, id DESC LIMIT ?",
+        params, path,
+    )
+
+
+def component_trend(component, board=None, limit=50, path=DEFAULT_HISTORY_PATH):
+    """Statuts d'un composant dans les `limit` derniers rapports qui le citent, du plus ancien au plus récent.
+
+    Le composant est comparé par repère normalisé ("u010 " retrouve U10).
+    """
+    component = normalize_designator(component)
+    board_filter = "AND runs.board = ?" if board else ""
+    params = (component, board, limit) if board else (component, limit)
+    trend = _query(
+        "SELECT runs.created_at, runs.board, runs.report_name, results.coverage, results.ppvs, results.remarks "
+        "FROM results JOIN runs ON runs.id = results.run_id "
+        f"WHERE results.component = ? {board_filter} "
+        "ORDER BY runs.created_at DESC, runs.id DESC LIMIT ?",
+        params, path,
+    )
+    return trend.iloc[::-1].reset_index(drop=True)
+
+
+def components_with_status(ppvs="NOTEST", latest_only=True, path=DEFAULT_HISTORY_PATH):
+    """Composants ayant le statut PPVS donné, sur toutes les cartes.
+
+    Par défaut, seul le dernier rapport enregistré de chaque carte est pris en compte.
+    """
+    latest_filter = ""
+    if latest_only:
+        # Dernier traitement de chaque carte, calculé une seule fois sur la table des traitements
+        latest_filter = (
+            "AND results.run_id IN (SELECT id FROM (SELECT id, ROW_NUMBER() OVER "
+            "(PARTITION BY board ORDER BY created_at DESC, id DESC) AS position FROM runs) WHERE position = 1)"
+        )
+    return _query(
+        "SELECT runs.board, results.component, results.coverage, results.remarks, runs.report_name, runs.created_at "
+        "FROM results JOIN runs ON runs.id = results.run_id "
+        f"WHERE results.ppvs = ? {latest_filter} "
+        "ORDER BY runs.board, results.component",
+        (ppvs,), path,
+    )
@@ -0,0 +1,438 @@
+"""Mise à jour incrémentale d'un classeur déjà complété (_updated.xlsx).
+
+Seules les lignes dont un repère figure dans le nouveau rapport sont
+recalculées. Le classeur n'est pas chargé par openpyxl : les valeurs de la
+feuille sont lues par le lecteur rapide de la nomenclature, puis l'archive
+est recopiée en ne réécrivant, dans le XML de la feuille, que les lignes
+dont une cellule suivie change. Sans modification, le classeur n'est pas
+réécrit.
+"""
+import datetime
+import io
+import math
+import re
+import zipfile
+
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from openpyxl.reader.workbook import WorkbookParser
+from openpyxl.styles.stylesheet import apply_stylesheet, write_stylesheet
+from openpyxl.utils import column_index_from_string, get_column_letter
+from openpyxl.utils.cell import coordinate_from_string
+from openpyxl.utils.datetime import to_excel
+from openpyxl.xml.constants import (
+    ARC_CONTENT_TYPES, ARC_STYLE, ARC_WORKBOOK, ARC_WORKBOOK_RELS, REL_NS, SHEET_MAIN_NS, WORKSHEET_TYPE,
+)
+from openpyxl.xml.functions import tostring
+
+from bom_loader import read_excel_sheet
+from completion import apply_report_data, build_status_frame
+from component_index import ComponentIndex
+from excel_export import RowStyles, add_validations, cell_xml, column_width
+
+# Colonnes recalculées à partir du rapport ; toutes les autres (STRATEGIE, BIBLIO...) restent intactes
+TRACKED_COLUMNS = ["COVERAGE %", "PPVS", "REMARKS"]
+CHANGELOG_SHEET = "Modifications"
+CHANGELOG_COLUMNS = ["Date", "Ligne", "COMP.", "Colonne", "Ancienne valeur", "Nouvelle valeur"]
+CHANGELOG_WIDTHS = (20, 8, 12, 14, 40, 40)
+
+# Éléments du XML des feuilles, repérés sans analyser le document entier
+_ROW_RE = re.compile(rb'<row\b([^>]*?)(?:/>|>(.*?)</row>)', re.S)
+_CELL_RE = re.compile(rb'<c\b[^>]*?\br="([A-Z]+)\d+"[^>]*?(?:/>|>.*?</c>)', re.S)
+_ROW_NUMBER_RE = re.compile(rb'\br="(\d+)"')
+_STYLE_RE = re.compile(rb'<c\b[^>]*?\bs="(\d+)"')
+_SPANS_RE = re.compile(rb'\s+spans="[^"]*"')
+_DIMENSION_RE = re.compile(rb'<dimension ref="([^"]*)"\s*/>')
+_COUNT_RE = re.compile(rb'<dataValidations\b[^>]*?\bcount="(\d+)"')
+_PRIORITY_RE = re.compile(rb'<cfRule\b[^>]*?\bpriority="(\d+)"')
+
+# Éléments qui suivent <conditionalFormatting> et <dataValidations> dans une feuille, dans l'ordre du schéma
+_AFTER_VALIDATIONS = [b"hyperlinks", b"printOptions", b"pageMargins", b"pageSetup", b"headerFooter", b"rowBreaks",
+                      b"colBreaks", b"customProperties", b"cellWatches", b"ignoredErrors", b"smartTags", b"drawing",
+                      b"legacyDrawing", b"legacyDrawingHF", b"picture", b"oleObjects", b"controls",
+                      b"webPublishItems", b"tableParts", b"extLst"]
+
+
+def _normalize(column, value):
+    # Valeurs comparables entre le classeur (couverture en fraction) et le calcul ("87.50%")
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if column == "COVERAGE %":
+        if isinstance(value, str) and "%" in value:
+            try:
+                return round(float(value.replace("%", "")) / 100, 6)
+            except ValueError:
+                return value
+        if isinstance(value, (int, float)):
+            return round(float(value), 6)
+    return value
+
+
+def compute_changes(components, current_values, report_data):
+    """Liste des cellules suivies dont la valeur change avec le nouveau rapport.
+
+    `components` contient la colonne COMP. et `current_values` les valeurs
+    actuelles de chaque colonne suivie, ligne par ligne. Seules les lignes
+    dont un repère (normalisé, plages développées) figure dans le rapport
+    sont recalculées.
+    """
+    status = build_status_frame(report_data)
+    rows = ComponentIndex(components).matching_rows(status.index)
+    if len(rows) == 0:
+        return []
+
+    subset = pd.DataFrame({"COMP.": [components[row] for row in rows]}, dtype=object)
+    for column in TRACKED_COLUMNS:
+        subset[column] = pd.Series([current_values[column][row] for row in rows], dtype=object)
+    updated, _, _ = apply_report_data(subset, report_data)
+
+    changes = []
+    for column in TRACKED_COLUMNS:
+        new_values = updated[column].tolist()
+        for position, row in enumerate(rows):
+            old = _normalize(column, current_values[column][row])
+            new = _normalize(column, new_values[position])
+            if old != new:
+                changes.append((int(row), components[row], column, old, new))
+    changes.sort()
+    return changes
+
+
+def _rewound(source):
+    # Chemin, ou flux relu depuis le début à chaque ouverture
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return source
+
+
+def _liste_columns(source):
+    # Menus de l'onglet Liste du classeur, dans l'ordre de ses colonnes : les validations y renvoient par position
+    workbook = load_workbook(_rewound(source), read_only=True)
+    try:
+        if "Liste" not in workbook.sheetnames:
+            return {}
+        rows = list(workbook["Liste"].iter_rows(values_only=True))
+    finally:
+        workbook.close()
+    if not rows:
+        return {}
+    columns = {}
+    for col_idx, name in enumerate(rows[0]):
+        values = [str(row[col_idx]) for row in rows[1:]
+                  if col_idx < len(row) and row[col_idx] is not None and str(row[col_idx]).strip() != ""]
+        # Colonne sans nom : conservée sous un nom factice pour ne pas décaler les suivantes
+        columns[str(name) if name is not None else f"\0{col_idx}"] = values
+    return columns
+
+
+def _cell_style(cell):
+    match = _STYLE_RE.match(cell)
+    return int(match.group(1)) if match else 0
+
+
+def _patch_row(attributes, content, row_number, cells, default_style):
+    """XML d'une ligne dont les cellules `cells` {colonne: (valeur, style)} sont remplacées ou ajoutées.
+
+    Un style None conserve celui de la cellule existante, sinon `default_style`.
+    """
+    existing = {column_index_from_string(match.group(1).decode("ascii")): match.group(0)
+                for match in _CELL_RE.finditer(content or b"")}
+    for column, (value, style) in cells.items():
+        if style is None:
+            style = _cell_style(existing[column]) if column in existing else default_style
+        existing[column] = cell_xml(f"{get_column_letter(column)}{row_number}", value, style).encode("utf-8")
+    # L'attribut spans (plage des colonnes de la ligne) ne serait plus exact
+    return (b"<row" + _SPANS_RE.sub(b"", attributes) + b">"
+            + b"".join(existing[column] for column in sorted(existing)) + b"</row>")
+
+
+def _iter_sheet_data(sheet_xml, start, end, row_cells, default_style, fill_cells=None):
+    """Contenu de <sheetData> par morceaux, seules les lignes de `row_cells` étant reconstruites.
+
+    `fill_cells` est ajouté à toutes les lignes de données (colonnes créées) ;
+    les lignes absentes du XML sont insérées à leur place.
+    """
+    view = memoryview(sheet_xml)
+    pending = sorted(row_cells)
+    position = start
+    for match in _ROW_RE.finditer(sheet_xml, start, end):
+        number = _ROW_NUMBER_RE.search(match.group(1))
+        if number is None:
+            continue
+        row_number = int(number.group(1))
+        if not fill_cells and not (pending and pending[0] <= row_number):
+            if not pending:
+                break
+            continue
+        yield view[position:match.start()]
+        while pending and pending[0] < row_number:
+            missing = pending.pop(0)
+            yield _patch_row(f' r="{missing}"'.encode("ascii"), None, missing, row_cells[missing], default_style)
+        cells = dict(fill_cells) if fill_cells and row_number > 1 else {}
+        if pending and pending[0] == row_number:
+            cells.update(row_cells[pending.pop(0)])
+        yield _patch_row(match.group(1), match.group(2), row_number, cells, default_style) if cells else match.group(0)
+        position = match.end()
+    yield view[position:end]
+    for missing in pending:
+        yield _patch_row(f' r="{missing}"'.encode("ascii"), None, missing, row_cells[missing], default_style)
+
+
+def _sheet_data_bounds(sheet_xml):
+    # Début et fin du contenu de <sheetData> (vide s'il s'écrit <sheetData/>)
+    empty = sheet_xml.find(b"<sheetData/>")
+    if empty >= 0:
+        return empty, empty + len(b"<sheetData/>"), True
+    start = sheet_xml.index(b">", sheet_xml.index(b"<sheetData")) + 1
+    return start, sheet_xml.rindex(b"</sheetData>"), False
+
+
+def _extend_dimension(head, last_column, last_row):
+    # Plage utilisée déclarée par la feuille, agrandie aux cellules écrites
+    match = _DIMENSION_RE.search(head)
+    if match is None:
+        return head
+    end = match.group(1).decode("ascii").split(":")[-1]
+    column, row = coordinate_from_string(end)
+    ref = f"A1:{get_column_letter(max(column_index_from_string(column), last_column))}{max(row, last_row)}"
+    return head[:match.start()] + f'<dimension ref="{ref}"/>'.encode("ascii") + head[match.end():]
+
+
+def _insert_before(tail, names, block):
+    # Insère `block` avant le premier des éléments `names` présent, sinon avant la fin de la feuille
+    positions = [tail.find(b"<" + name) for name in names]
+    positions = [position for position in positions if position >= 0]
+    position = min(positions) if positions else tail.rindex(b"</worksheet>")
+    return tail[:position] + block + tail[position:]
+
+
+def _with_validations(tail, validations, formattings):
+    if formattings:
+        tail = _insert_before(tail, [b"dataValidations"] + _AFTER_VALIDATIONS, b"".join(formattings))
+    if not validations:
+        return tail
+    match = _COUNT_RE.search(tail)
+    if match is None:
+        block = f'<dataValidations count="{len(validations)}">'.encode("ascii") + b"".join(validations)
+        return _insert_before(tail, _AFTER_VALIDATIONS, block + b"</dataValidations>")
+    count = str(int(match.group(1)) + len(validations)).encode("ascii")
+    tail = tail[:match.start(1)] + count + tail[match.end(1):]
+    return _insert_before(tail, [b"/dataValidations"], b"".join(validations))
+
+
+def _changelog_rows(changes, first_row, styles):
+    # Lignes de l'onglet Modifications ; la ligne Excel tient compte de l'en-tête
+    timestamp = to_excel(datetime.datetime.now().replace(microsecond=0))
+    date_style = styles.date("yyyy-mm-dd h:mm:ss")
+    rows = []
+    for row_number, (row, component, column, old, new) in enumerate(changes, first_row):
+        values = [row + 2, component, column, old, new]
+        cells = [cell_xml(f"A{row_number}", timestamp, date_style)] + [
+            cell_xml(f"{letter}{row_number}", value, styles.data) for letter, value in zip("BCDEF", values)
+        ]
+        rows.append(f'<row r="{row_number}">{"".join(cells)}</row>')
+    return "".join(rows).encode("utf-8")
+
+
+class WorkbookPatch:
+    """Modifications apportées par un nouveau rapport à un classeur déjà complété.
+
+    Le calcul ne lit que les valeurs de la feuille ; `write` produit le
+    classeur modifié. Les colonnes suivies absentes sont ajoutées en fin de
+    tableau, avec le style, les menus déroulants (onglet Liste du classeur)
+    et le formatage conditionnel de l'export.
+    """
+
+    def __init__(self, source, report_data, sheet_name="Nomenclature"):
+        self.source = source
+        with zipfile.ZipFile(_rewound(source)) as archive:
+            parser = WorkbookParser(archive, ARC_WORKBOOK)
+            parser.parse()
+            self.sheet_paths = {sheet.name: rel.target for sheet, rel in parser.find_sheets()}
+            self.sheet_ids = [sheet.sheetId for sheet in parser.sheets]
+            self.relation_ids = set(parser.rels)
+        self.sheet_name = sheet_name if sheet_name in self.sheet_paths else next(iter(self.sheet_paths))
+
+        df = read_excel_sheet(_rewound(source), self.sheet_name)
+        if "COMP." not in df.columns:
+            raise ValueError(f"Colonne 'COMP.' introuvable dans l'onglet '{self.sheet_name}'")
+        self.header = [str(column) for column in df.columns]
+        self.added_columns = [column for column in TRACKED_COLUMNS if column not in self.header]
+        self.row_count = len(df)
+
+        values = {column: df[column].astype(object).where(df[column].notna(), None).tolist()
+                  for column in ["COMP."] + TRACKED_COLUMNS if column in df.columns}
+        current_values = {column: values.get(column, [None] * len(df)) for column in TRACKED_COLUMNS}
+        self.changes = compute_changes(values["COMP."], current_values, report_data)
+
+    @property
+    def modified(self):
+        """Le classeur doit-il être réécrit (cellules modifiées ou colonnes à ajouter) ?"""
+        return bool(self.changes or self.added_columns)
+
+    def changes_frame(self):
+        return pd.DataFrame(
+            [(row + 2, component, column, old, new) for row, component, column, old, new in self.changes],
+            columns=CHANGELOG_COLUMNS[1:],
+        )
+
+    def write(self, output):
+        """Écrit le classeur modifié dans `output` ; les autres entrées de l'archive sont recopiées."""
+        with zipfile.ZipFile(_rewound(self.source)) as source:
+            # Styles du classeur, complétés au besoin par ceux de l'export
+            workbook = Workbook()
+            apply_stylesheet(source, workbook)
+            style_counts = (len(workbook._cell_styles), len(workbook._differential_styles.styles))
+            styles = RowStyles(workbook.active)
+
+            sheet_path = self.sheet_paths[self.sheet_name]
+            sheet_xml = source.read(sheet_path)
+            # Style des en-têtes de l'export, repris par les colonnes ajoutées et l'onglet Modifications
+            header_style = _cell_style(_CELL_RE.search(sheet_xml).group(0))
+            contents = {sheet_path: self._sheet_contents(sheet_xml, header_style, styles, workbook)}
+            changelog_path = self.sheet_paths.get(CHANGELOG_SHEET)
+            if self.changes and changelog_path is None:
+                changelog_path = self._add_changelog_sheet(source, contents)
+                contents[changelog_path] = [self._new_changelog(header_style, styles)]
+            elif self.changes:
+                contents[changelog_path] = [self._appended_changelog(source.read(changelog_path), styles)]
+
+            if (len(workbook._cell_styles), len(workbook._differential_styles.styles)) != style_counts:
+                contents[ARC_STYLE] = [tostring(write_stylesheet(workbook))]
+
+            with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as target:
+                for item in source.infolist():
+                    if item.filename not in contents:
+                        target.writestr(item, source.read(item.filename))
+                        continue
+                    with target.open(item, "w", force_zip64=True) as entry:
+                        for chunk in contents.pop(item.filename):
+                            entry.write(chunk)
+                for path, chunks in contents.items():
+                    with target.open(path, "w", force_zip64=True) as entry:
+                        for chunk in chunks:
+                            entry.write(chunk)
+
+    def _sheet_contents(self, sheet_xml, header_style, styles, workbook):
+        # Morceaux du XML de la feuille, seules les lignes modifiées étant reconstruites
+        start, end, empty = _sheet_data_bounds(sheet_xml)
+        head, tail = sheet_xml[:start], sheet_xml[end:]
+        if empty:
+            head, tail = head + b"<sheetData>", b"</sheetData>" + tail
+            start = end
+
+        columns = self.header + self.added_columns
+        column_numbers = {column: columns.index(column) + 1 for column in TRACKED_COLUMNS}
+        row_cells = {}
+        for row, _, column, _, new in self.changes:
+            if column == "COVERAGE %" and isinstance(new, float):
+                style = styles.percent
+            elif column == "PPVS":
+                style = styles.center
+            else:
+                style = None
+            row_cells.setdefault(row + 2, {})[column_numbers[column]] = (new, style)
+
+        fill_cells = None
+        if self.added_columns:
+            fill_cells = {column_numbers[column]: (None, styles.data) for column in self.added_columns}
+            row_cells.setdefault(1, {}).update(
+                {column_numbers[column]: (column, header_style) for column in self.added_columns})
+            head = _extend_dimension(head, len(columns), self.row_count + 1)
+            tail = self._added_validations(tail, columns, workbook)
+            if b"</cols>" in head:
+                head = head.replace(b"</cols>", self._added_widths(column_numbers) + b"</cols>")
+
+        return [head, *_iter_sheet_data(sheet_xml, start, end, row_cells, styles.data, fill_cells), tail]
+
+    def _added_widths(self, column_numbers):
+        # Largeur calculée comme à l'export, sur les valeurs écrites dans la colonne
+        cols = []
+        for column in self.added_columns:
+            values = pd.Series([new for _, _, name, _, new in self.changes if name == column], dtype=object)
+            col_num = column_numbers[column]
+            cols.append(f'<col width="{column_width(values, column)}" customWidth="1" min="{col_num}" max="{col_num}"/>')
+        return "".join(cols).encode("utf-8")
+
+    def _added_validations(self, tail, columns, workbook):
+        # Menus déroulants et formatage conditionnel des colonnes ajoutées, tels que les pose l'export
+        dropdown_columns = _liste_columns(self.source)
+        worksheet = workbook.create_sheet()
+        add_validations(worksheet, [column if column in self.added_columns else None for column in columns],
+                        max(self.row_count, 1), dropdown_columns)
+        formattings = []
+        dxfs = workbook._differential_styles
+        # Les priorités des règles doivent rester uniques dans la feuille
+        priority = max((int(value) for value in _PRIORITY_RE.findall(tail)), default=0)
+        for formatting in worksheet.conditional_formatting:
+            for rule in formatting.rules:
+                rule.priority += priority
+                if rule.dxf is None:
+                    continue
+                if rule.dxf not in dxfs.styles:
+                    dxfs.append(rule.dxf)
+                rule.dxfId = dxfs.styles.index(rule.dxf)
+            formattings.append(tostring(formatting.to_tree()))
+        validations = [tostring(validation.to_tree()) for validation in worksheet.data_validations.dataValidation]
+        return _with_validations(tail, validations, formattings)
+
+    def _new_changelog(self, header_style, styles):
+        cols = "".join(f'<col width="{width}" customWidth="1" min="{col_num}" max="{col_num}"/>'
+                       for col_num, width in enumerate(CHANGELOG_WIDTHS, 1))
+        header = "".join(cell_xml(f"{get_column_letter(col_num)}1", column, header_style)
+                         for col_num, column in enumerate(CHANGELOG_COLUMNS, 1))
+        return (f'<worksheet xmlns="{SHEET_MAIN_NS}"><cols>{cols}</cols><sheetData><row r="1">{header}</row>'
+                .encode("utf-8") + _changelog_rows(self.changes, 2, styles) + b"</sheetData></worksheet>")
+
+    def _appended_changelog(self, sheet_xml, styles):
+        start, end, empty = _sheet_data_bounds(sheet_xml)
+        last = sheet_xml.rfind(b"<row", start, end)
+        last_row = int(_ROW_NUMBER_RE.search(sheet_xml, last).group(1)) if last >= 0 else 1
+        rows = _changelog_rows(self.changes, last_row + 1, styles)
+        head = _extend_dimension(sheet_xml[:start], len(CHANGELOG_COLUMNS), last_row + len(self.changes))
+        if empty:
+            return head + b"<sheetData>" + rows + b"</sheetData>" + sheet_xml[end:]
+        return head + sheet_xml[start:end] + rows + sheet_xml[end:]
+
+    def _add_changelog_sheet(self, source, contents):
+        # Nouvel onglet déclaré dans le classeur, ses relations et les types de contenu
+        names = set(source.namelist())
+        number = 1
+        while f"xl/worksheets/sheet{number}.xml" in names:
+            number += 1
+        path = f"xl/worksheets/sheet{number}.xml"
+        relation = 1
+        while f"rId{relation}" in self.relation_ids:
+            relation += 1
+
+        workbook_xml = source.read(ARC_WORKBOOK)
+        sheet = (f'<sheet xmlns:r="{REL_NS}" name="{CHANGELOG_SHEET}" sheetId="{max(self.sheet_ids) + 1}" '
+                 f'state="visible" r:id="rId{relation}"/>')
+        contents[ARC_WORKBOOK] = [workbook_xml.replace(b"</sheets>", sheet.encode("utf-8") + b"</sheets>")]
+        rels_xml = source.read(ARC_WORKBOOK_RELS)
+        rel = f'<Relationship Type="{REL_NS}/worksheet" Target="/{path}" Id="rId{relation}"/>'
+        contents[ARC_WORKBOOK_RELS] = [rels_xml.replace(b"</Relationships>", rel.encode("utf-8") + b"</Relationships>")]
+        types_xml = source.read(ARC_CONTENT_TYPES)
+        override = f'<Override PartName="/{path}" ContentType="{WORKSHEET_TYPE}"/>'
+        contents[ARC_CONTENT_TYPES] = [types_xml.replace(b"</Types>", override.encode("utf-8") + b"</Types>")]
+        return path
+
+
+def patch_workbook(source, report_data, output=None, sheet_name="Nomenclature"):
+    """Met à jour un classeur déjà complété (_updated.xlsx) avec un nouveau rapport.
+
+    Seules les cellules COVERAGE % / PPVS / REMARKS dont la valeur change sont
+    réécrites, les modifications étant consignées dans l'onglet
+    "Modifications". Retourne le flux de sortie et le DataFrame des
+    changements ; sans modification, c'est la source elle-même qui est
+    retournée (repositionnée au début) et `output` n'est pas écrit.
+    """
+    patch = WorkbookPatch(source, report_data, sheet_name)
+    if not patch.modified:
+        return _rewound(source), patch.changes_frame()
+    if output is None:
+        output = io.BytesIO()
+    patch.write(output)
+    if hasattr(output, "seek"):
+        output.seek(0)
+    return output, patch.changes_frame()
@@ -0,0 +1,348 @@
+import bz2
+import gzip
+import lzma
+import mmap
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from report_parser import (BLOCK_SIZE, SECTION_START_PATTERN, ReportParser, iter_line_blocks, parse_report_stream,
+                           split_report)
+
+# Au-delà de cette taille (Mo), un rapport en mémoire est recopié dans un fichier temporaire
+SPOOL_THRESHOLD = int(os.environ.get("EXCEL_COMPLETER_SPOOL_MB", "64")) * 1024 * 1024
+COPY_BLOCK_SIZE = 1024 * 1024
+# Au-delà de cette taille (Mo), un rapport sur disque est analysé en parallèle sur plusieurs processus
+PARALLEL_THRESHOLD = int(os.environ.get("EXCEL_COMPLETER_PARALLEL_MB", "256")) * 1024 * 1024
+# Plages par processus : des plages plus petites équilibrent mieux la charge
+CHUNKS_PER_WORKER = 4
+# Taille des blocs analysés entre deux signalements de progression
+PROGRESS_BLOCK_SIZE = 8 * 1024 * 1024
+
+# Signatures des rapports compressés (décompressés au fil de la lecture) et des archives zip
+COMPRESSION_MAGIC = {
+    b"\x1f\x8b": gzip.open,
+    b"\xfd7zXZ\x00": lzma.open,
+    b"BZh": bz2.open,
+}
+ZIP_MAGIC = b"PK\x03\x04"
+MAGIC_SIZE = 6
+# Extensions des rapports, éventuellement compressés (carte.txt.gz) ou en archive zip
+REPORT_SUFFIXES = (".txt", ".log", ".rpt")
+ARCHIVE_SUFFIXES = (".gz", ".xz", ".bz2", ".zip")
+# Début lu pour reconnaître un rapport sans extension à ses sections
+SNIFF_SIZE = 1024 * 1024
+
+
+def _stream_size(stream):
+    if hasattr(stream, "getbuffer"):
+        return stream.getbuffer().nbytes
+    position = stream.tell()
+    size = stream.seek(0, os.SEEK_END)
+    stream.seek(position)
+    return size
+
+
+def _has_fileno(stream):
+    try:
+        stream.fileno()
+    except (AttributeError, OSError, ValueError):
+        return False
+    return True
+
+
+@contextmanager
+def mapped_file(file):
+    """Projection en mémoire, en lecture seule, d'un fichier ouvert en binaire."""
+    if os.fstat(file.fileno()).st_size == 0:
+        yield b""
+        return
+    buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        yield buffer
+    finally:
+        buffer.close()
+
+
+@contextmanager
+def spooled_copy(stream):
+    """Recopie un flux dans un fichier temporaire, supprimé à la sortie du bloc."""
+    stream.seek(0)
+    with tempfile.TemporaryFile() as spool:
+        shutil.copyfileobj(stream, spool, COPY_BLOCK_SIZE)
+        spool.flush()
+        spool.seek(0)
+        yield spool
+    stream.seek(0)
+
+
+def report_stem(file_name):
+    """Nom d'un rapport sans extension ("carte.txt.gz" -> "carte"), None si ce n'est pas un rapport."""
+    stem, suffix = os.path.splitext(os.path.basename(file_name))
+    if suffix.lower() in ARCHIVE_SUFFIXES:
+        stem, suffix = os.path.splitext(stem)
+    return stem if suffix.lower() in REPORT_SUFFIXES else None
+
+
+def looks_like_report(path):
+    """Vrai si le début du fichier contient une section de rapport ("Test Summary for", "Untested Devices"...)."""
+    with open(path, "rb") as file:
+        return SECTION_START_PATTERN.search(file.read(SNIFF_SIZE)) is not None
+
+
+class ArchiveMember:
+    """Rapport contenu dans une archive zip, analysé comme un rapport à part entière.
+
+    `archive` est un chemin ou un fichier ouvert ; pour un fichier ouvert,
+    les membres partagent le même ZipFile (lectures protégées par son
+    verrou), à fermer avec `close()` une fois les membres lus, et
+    l'empreinte de l'archive calculée à l'ouverture.
+    """
+
+    def __init__(self, archive, member, size, zip_file=None, archive_hash=None):
+        self.archive = archive
+        self.member = member
+        self.size = size
+        self.archive_hash = archive_hash
+        self._zip_file = zip_file
+        archive_name = os.fspath(archive) if isinstance(archive, (str, os.PathLike)) else getattr(archive, "name", "")
+        self.name = f"{os.path.basename(archive_name)}/{member}"
+
+    def __getstate__(self):
+        # Envoyé à un processus du pool : l'archive sur disque y est rouverte
+        return {**self.__dict__, "_zip_file": None}
+
+    @contextmanager
+    def open(self):
+        if self._zip_file is not None:
+            with self._zip_file.open(self.member) as member:
+                yield member
+            return
+        with zipfile.ZipFile(self.archive) as zip_file, zip_file.open(self.member) as member:
+            yield member
+
+    def close(self):
+        # Le fichier ouvert de l'archive reste à son propriétaire : seul le ZipFile est fermé
+        if self._zip_file is not None:
+            self._zip_file.close()
+
+
+def _peek(source, size=MAGIC_SIZE):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as file:
+            return file.read(size)
+    position = source.tell()
+    source.seek(0)
+    head = source.read(size)
+    source.seek(position)
+    return head
+
+
+def _decompressor(head):
+    for magic, opener in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return opener
+    return None
+
+
+def is_zip_archive(source):
+    return not isinstance(source, ArchiveMember) and _peek(source, len(ZIP_MAGIC)) == ZIP_MAGIC
+
+
+def _report_members(zip_file):
+    # Fichiers de l'archive, sans les dossiers ni les métadonnées ajoutées par macOS
+    return [
+        info for info in zip_file.infolist()
+        if not info.is_dir() and info.file_size > 0
+        and not info.filename.startswith("__MACOSX/") and not os.path.basename(info.filename).startswith(".")
+    ]
+
+
+def expand_archives(sources, content_hash=None):
+    """Remplace chaque archive zip par ses rapports (ArchiveMember), dans l'ordre de l'archive.
+
+    `content_hash`, s'il est fourni, calcule l'empreinte des archives
+    ouvertes, réutilisée comme clé de cache de leurs membres. Les membres
+    d'une archive ouverte sont à fermer (`close_archives`) après analyse.
+    """
+    expanded = []
+    for source in sources:
+        if not is_zip_archive(source):
+            expanded.append(source)
+            continue
+        if isinstance(source, (str, os.PathLike)):
+            with zipfile.ZipFile(source) as zip_file:
+                expanded.extend(
+                    ArchiveMember(source, info.filename, info.file_size) for info in _report_members(zip_file)
+                )
+            continue
+        archive_hash = content_hash(source) if content_hash is not None else None
+        zip_file = zipfile.ZipFile(source)
+        expanded.extend(
+            ArchiveMember(source, info.filename, info.file_size, zip_file, archive_hash)
+            for info in _report_members(zip_file)
+        )
+    return expanded
+
+
+def close_archives(sources):
+    """Ferme les ZipFile partagés par les membres d'archives ouvertes retournés par `expand_archives`."""
+    for source in sources:
+        if isinstance(source, ArchiveMember):
+            source.close()
+
+
+def is_on_disk(source):
+    if isinstance(source, ArchiveMember):
+        return isinstance(source.archive, (str, os.PathLike))
+    return isinstance(source, (str, os.PathLike))
+
+
+def _parse_decompressed(raw, opener, progress):
+    # Décompression par blocs de lignes : le texte complet n'est jamais en mémoire
+    total = _stream_size(raw)
+    raw.seek(0)
+    parser = ReportParser()
+    with opener(raw) as stream:
+        for block in iter_line_blocks(stream, BLOCK_SIZE):
+            parser.feed(block)
+            if progress is not None:
+                # Progression mesurée sur les octets compressés déjà lus
+                progress(raw.tell(), total)
+    return parser.result()
+
+
+def _parse_member(member, progress):
+    with member.open() as stream:
+        if progress is None:
+            return parse_report_stream(stream)
+        return _parse_blocks(iter_line_blocks(stream), member.size, progress)
+
+
+def parse_report_buffer(buffer):
+    # Les motifs s'appliquent directement aux octets du tampon, sans décodage
+    parser = ReportParser()
+    parser.feed(buffer)
+    return parser.result()
+
+
+def _buffer_blocks(buffer, block_size=PROGRESS_BLOCK_SIZE):
+    # Blocs d'environ block_size octets du tampon, arrêtés en fin de ligne
+    start = 0
+    size = len(buffer)
+    while start < size:
+        end = buffer.find(b"\n", min(start + block_size, size) - 1)
+        end = size if end < 0 else end + 1
+        yield buffer[start:end]
+        start = end
+
+
+def _parse_blocks(blocks, total, progress):
+    parser = ReportParser()
+    done = 0
+    for block in blocks:
+        parser.feed(block)
+        done += len(block)
+        progress(done, total)
+    return parser.result()
+
+
+def _parse_range(path, start, end):
+    # Exécuté dans un processus du pool : l'analyseur partiel est renvoyé tel quel
+    parser = ReportParser()
+    with open(path, "rb") as file, mapped_file(file) as buffer:
+        parser.feed(buffer[start:end])
+    return parser
+
+
+def parse_report_parallel(path, workers=None, progress=None):
+    """Analyse un rapport sur disque par plages d'octets réparties sur un pool de processus.
+
+    Les résultats partiels sont fusionnés dans l'ordre du fichier. Une plage
+    qui commence alors que la précédente attend encore la fin d'un bloc
+    (pourcentage, résultat PASS/FAIL, section "Untested Devices") est
+    réanalysée dans le prolongement de l'état courant : le résultat est
+    toujours identique à celui de l'analyse en série.
+    """
+    workers = workers or os.cpu_count() or 1
+    with open(path, "rb") as file, mapped_file(file) as buffer:
+        ranges = split_report(buffer, workers * CHUNKS_PER_WORKER)
+        if len(ranges) < 2:
+            return parse_report_buffer(buffer)
+
+        parser = ReportParser()
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as executor:
+            partials = executor.map(_parse_range, [path] * len(ranges), *zip(*ranges))
+            for (start, end), partial in zip(ranges, partials):
+                if parser.can_absorb(partial):
+                    parser.absorb(partial)
+                else:
+                    parser.feed(buffer[start:end])
+                if progress is not None:
+                    progress(end, len(buffer))
+        return parser.result()
+
+
+def read_report(source, spool_threshold=SPOOL_THRESHOLD, workers=None, parallel_threshold=PARALLEL_THRESHOLD,
+                progress=None):
+    """Analyse un rapport depuis un chemin ou un fichier ouvert en binaire.
+
+    Les fichiers sur disque sont projetés en mémoire (mmap), et analysés en
+    parallèle au-delà de `parallel_threshold` octets si `workers` le permet ;
+    les fichiers téléversés dépassant `spool_threshold` octets sont d'abord
+    recopiés dans un fichier temporaire, les plus petits sont lus par blocs
+    de lignes. `progress(octets_analysés, total)` est appelée au fil de
+    l'analyse.
+
+    Un rapport compressé (gzip, xz, bzip2, reconnu à sa signature) est
+    décompressé au fil de la lecture ; une archive zip doit ne contenir
+    qu'un rapport (voir `expand_archives` pour en analyser plusieurs).
+    """
+    workers = workers or os.cpu_count() or 1
+    if isinstance(source, ArchiveMember):
+        return _parse_member(source, progress)
+
+    head = _peek(source)
+    if head.startswith(ZIP_MAGIC):
+        members = expand_archives([source])
+        try:
+            if len(members) != 1:
+                raise ValueError(f"L'archive contient {len(members)} rapports : ils doivent être analysés séparément")
+            return _parse_member(members[0], progress)
+        finally:
+            close_archives(members)
+    opener = _decompressor(head)
+    if opener is not None:
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, "rb") as raw:
+                return _parse_decompressed(raw, opener, progress)
+        return _parse_decompressed(source, opener, progress)
+
+    if isinstance(source, (str, os.PathLike)):
+        if workers > 1 and os.path.getsize(source) > parallel_threshold:
+            return parse_report_parallel(source, workers, progress)
+        with open(source, "rb") as file, mapped_file(file) as buffer:
+            return _parse_mapped(buffer, progress)
+
+    if _has_fileno(source):
+        with mapped_file(source) as buffer:
+            return _parse_mapped(buffer, progress)
+
+    size = _stream_size(source)
+    if size > spool_threshold:
+        with spooled_copy(source) as spool, mapped_file(spool) as buffer:
+            return _parse_mapped(buffer, progress)
+
+    source.seek(0)
+    if progress is not None:
+        return _parse_blocks(iter_line_blocks(source), size, progress)
+    return parse_report_stream(source)
+
+
+def _parse_mapped(buffer, progress):
+    if progress is None:
+        return parse_report_buffer(buffer)
+    return _parse_blocks(_buffer_blocks(buffer), len(buffer), progress)
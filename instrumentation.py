@@ -0,0 +1,164 @@
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Intervalle d'échantillonnage de la mémoire suivie par tracemalloc (secondes)
+SAMPLE_INTERVAL = 0.005
+
+# Étape en cours dans ce contexte, à laquelle les threads de travail ajoutent leur temps CPU
+_current_stage = ContextVar("current_stage", default=None)
+
+
+def _children_cpu():
+    # Temps CPU des processus fils terminés (pools de processus), 0 si indisponible
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class _MemorySampler:
+    """Suivi mémoire partagé par toutes les étapes mesurées du processus.
+
+    tracemalloc est démarré par la première étape et arrêté après la
+    dernière, sans jamais être réinitialisé : un thread relève la mémoire
+    suivie toutes les SAMPLE_INTERVAL secondes et met à jour le maximum de
+    chaque étape en cours. Les étapes simultanées ne s'attendent pas.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = {}
+        self._started_tracing = False
+        self._stop = None
+
+    def start(self, key):
+        with self._lock:
+            if not self._active:
+                # tracemalloc peut déjà être actif (outil de profilage) : il est alors laissé tel quel
+                self._started_tracing = not tracemalloc.is_tracing()
+                if self._started_tracing:
+                    tracemalloc.start()
+                self._stop = threading.Event()
+                threading.Thread(target=self._run, args=(self._stop,), name="memory-sampler", daemon=True).start()
+            current = tracemalloc.get_traced_memory()[0]
+            self._active[key] = [current, current]
+
+    def stop(self, key):
+        with self._lock:
+            start, maximum = self._active.pop(key)
+            peak = max(maximum, tracemalloc.get_traced_memory()[0]) - start
+            if not self._active:
+                self._stop.set()
+                if self._started_tracing:
+                    tracemalloc.stop()
+            return peak
+
+    def _run(self, stop):
+        while not stop.wait(SAMPLE_INTERVAL):
+            with self._lock:
+                if stop.is_set():
+                    return
+                current = tracemalloc.get_traced_memory()[0]
+                for sample in self._active.values():
+                    sample[1] = max(sample[1], current)
+
+
+_memory_sampler = _MemorySampler()
+
+
+def measured(function):
+    """Enveloppe une tâche de pool de threads pour ajouter son temps CPU à l'étape en cours."""
+    record = _current_stage.get()
+    if record is None:
+        return function
+
+    def run(*args, **kwargs):
+        start = time.thread_time()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            with record["lock"]:
+                record["worker_cpu"] += time.thread_time() - start
+    return run
+
+
+class StageMetrics:
+    """Mesure la durée, le temps CPU et le pic mémoire de chaque étape du traitement.
+
+    Désactivée, elle n'enregistre rien : les blocs `stage()` s'exécutent
+    sans surcoût. Le temps CPU additionne le thread de l'étape, les tâches
+    de ses pools de threads (`measured`) et ses processus fils terminés. Le
+    pic mémoire est échantillonné sur la mémoire suivie par tracemalloc,
+    commune au processus : les traitements simultanés ne s'attendent pas,
+    mais leurs allocations s'ajoutent, et le chiffre est alors approximatif.
+    Le suivi mémoire ralentit les allocations, il peut être désactivé
+    séparément.
+    """
+
+    def __init__(self, enabled=True, track_memory=True):
+        self.enabled = enabled
+        self.track_memory = track_memory
+        self.stages = []
+        self._origin = None
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        record = {"lock": threading.Lock(), "worker_cpu": 0.0}
+        token = _current_stage.set(record)
+        if self.track_memory:
+            _memory_sampler.start(id(record))
+        if self._origin is None:
+            self._origin = time.perf_counter()
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        children_start = _children_cpu()
+        try:
+            yield
+        finally:
+            wall_end = time.perf_counter()
+            cpu = time.thread_time() - cpu_start + _children_cpu() - children_start + record["worker_cpu"]
+            peak = _memory_sampler.stop(id(record)) if self.track_memory else None
+            _current_stage.reset(token)
+            self.stages.append({
+                "stage": name,
+                "start": wall_start - self._origin,
+                "wall": wall_end - wall_start,
+                "cpu": cpu,
+                "peak_memory": peak,
+            })
+
+    def timings(self):
+        return {entry["stage"]: entry["wall"] for entry in self.stages}
+
+    def to_frame(self):
+        """Tableau récapitulatif en unités lisibles (secondes, Mo)."""
+        frame = pd.DataFrame(self.stages, columns=["stage", "start", "wall", "cpu", "peak_memory"])
+        frame["peak_memory"] = frame["peak_memory"] / 1024 / 1024
+        return frame.rename(columns={
+            "stage": "Étape",
+            "start": "Début (s)",
+            "wall": "Durée (s)",
+            "cpu": "CPU (s)",
+            "peak_memory": "Pic mémoire (Mo)",
+        })
+
+    def to_dict(self):
+        return {"stages": self.stages, "total": sum(entry["wall"] for entry in self.stages)}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2, ensure_ascii=False)
@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Nombre de traitements exécutés simultanément pour l'ensemble des sessions
+DEFAULT_JOB_WORKERS = int(os.environ.get("EXCEL_COMPLETER_JOB_WORKERS", "4"))
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """Traitement exécuté en arrière-plan, avec sa progression par étape.
+
+    La fonction exécutée reçoit le job en premier argument et appelle
+    `report()` au fil du traitement ; une annulation demandée est levée
+    (JobCancelled) au signalement suivant.
+    """
+
+    def __init__(self, key=None):
+        self.key = key
+        self.stage = None
+        self.progress = {}
+        self.started = time.time()
+        self.finished = None
+        self.future = None
+        self._cancel_event = threading.Event()
+
+    def report(self, stage, done=None, total=None):
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+        self.stage = stage
+        self.progress[stage] = (done, total)
+
+    def progress_callback(self, stage):
+        # Adaptateur pour les fonctions qui signalent (fait, total)
+        return lambda done, total: self.report(stage, done, total)
+
+    def cancel(self):
+        self._cancel_event.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    @property
+    def status(self):
+        if self.future is None or not self.future.done():
+            return "en cours" if self.stage is not None else "en attente"
+        if self.future.cancelled() or isinstance(self.future.exception(), JobCancelled):
+            return "annulé"
+        if self.future.exception() is not None:
+            return "erreur"
+        return "terminé"
+
+    def result(self):
+        return self.future.result()
+
+    def error(self):
+        if self.future is None or not self.future.done() or self.future.cancelled():
+            return None
+        error = self.future.exception()
+        return None if isinstance(error, JobCancelled) else error
+
+
+class JobManager:
+    """Pool de threads partagé par toutes les sessions de l'application.
+
+    Chaque session soumet ses traitements au pool : une session occupée ne
+    bloque ni son propre script Streamlit ni celles des autres utilisateurs.
+    """
+
+    def __init__(self, max_workers=DEFAULT_JOB_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="excel-completer")
+
+    def submit(self, function, *args, key=None, **kwargs):
+        job = Job(key)
+
+        def run():
+            try:
+                return function(job, *args, **kwargs)
+            finally:
+                job.finished = time.time()
+
+        job.future = self._executor.submit(run)
+        return job
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
@@ -0,0 +1,98 @@
+"""Classeurs de plusieurs nomenclatures : une feuille par carte ou variante d'un panneau.
+
+Les feuilles sont lues en une seule ouverture du classeur. Chacune est
+associée aux rapports portant son nom (carte_A.txt pour la feuille
+"carte_A"), sinon aux rapports communs, puis complétée sur un pool de
+threads. Le classeur produit conserve les feuilles dans leur ordre et
+partage un seul onglet Liste.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from completion import apply_report_data, report_components
+from component_index import ComponentIndex
+from incremental import TRACKED_COLUMNS
+from instrumentation import measured
+from ingestion import report_stem
+from preview import changed_rows
+
+# Nombre de feuilles complétées simultanément, par défaut un thread par cœur
+SHEET_WORKERS = int(os.environ.get("EXCEL_COMPLETER_SHEET_WORKERS", "0")) or os.cpu_count() or 1
+# Toutes les feuilles du classeur (sauf Liste et Modifications)
+ALL_SHEETS = "*"
+# Colonne ajoutée aux tables en colonnes pour distinguer les feuilles
+SHEET_COLUMN = "FEUILLE"
+EMPTY_REPORT = {"coverage": {}, "notest": {}, "pmsg_not_used": [], "pass_tests": {}}
+
+
+def sheet_reports(sheet_names, report_names):
+    """Positions des rapports de chaque feuille : ceux portant son nom, sinon les rapports communs.
+
+    La comparaison ignore la casse et l'extension du rapport ("Carte_A.txt.gz"
+    correspond à la feuille "carte_a").
+    """
+    sheets_by_key = {name.strip().casefold(): name for name in sheet_names}
+    own = {name: [] for name in sheet_names}
+    shared = []
+    for position, report_name in enumerate(report_names):
+        # Rapport envoyé sans extension connue : son nom complet
+        stem = report_stem(report_name) or os.path.splitext(os.path.basename(report_name))[0]
+        sheet = sheets_by_key.get(stem.strip().casefold())
+        if sheet is None:
+            shared.append(position)
+        else:
+            own[sheet].append(position)
+    return {name: own[name] or shared for name in sheet_names}
+
+
+def complete_sheet(df, report_data):
+    """Complète une feuille ; les feuilles sans colonne COMP. sont recopiées telles quelles.
+
+    Une feuille recopiée n'a pas de couleurs PPVS (`format_info` à None) :
+    l'export l'écrit sans mise en forme ni menu déroulant.
+    """
+    if "COMP." not in df.columns:
+        return {"df": df, "format_info": None, "processed_count": 0,
+                "changed": np.zeros(len(df), dtype=bool), "unmatched": {"nomenclature": [], "report": []}}
+    index = ComponentIndex(df["COMP."])
+    before = df.reindex(columns=TRACKED_COLUMNS)
+    df, format_info, processed_count = apply_report_data(df, report_data, index)
+    bom_only, report_only = index.unmatched(report_components(report_data))
+    return {"df": df, "format_info": format_info, "processed_count": processed_count,
+            "changed": changed_rows(before, df), "unmatched": {"nomenclature": bom_only, "report": report_only}}
+
+
+def complete_sheets(sheets, report_data_by_sheet, workers=None, progress=None):
+    """Complète chaque feuille avec son rapport, simultanément sur `workers` threads.
+
+    `sheets` associe chaque nom de feuille à son DataFrame et
+    `report_data_by_sheet` à ses données de rapport (aucune : feuille
+    recopiée sans statut). Retourne {feuille: résultat de `complete_sheet`}
+    dans l'ordre des feuilles ; `progress(feuilles_faites, total)` est appelée
+    après chaque feuille.
+    """
+    workers = max(1, min(workers or SHEET_WORKERS, len(sheets)))
+    results = {}
+    task = measured(complete_sheet)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            name: executor.submit(task, df, report_data_by_sheet.get(name) or EMPTY_REPORT)
+            for name, df in sheets.items()
+        }
+        for done, (name, future) in enumerate(futures.items(), start=1):
+            results[name] = future.result()
+            if progress is not None:
+                progress(done, len(sheets))
+    return results
+
+
+def combined_frame(results):
+    """Toutes les feuilles complétées dans un seul DataFrame, précédées du nom de leur feuille."""
+    frames = [result["df"].assign(**{SHEET_COLUMN: name}) for name, result in results.items()]
+    if not frames:
+        return pd.DataFrame(columns=[SHEET_COLUMN])
+    combined = pd.concat(frames, ignore_index=True)
+    return combined[[SHEET_COLUMN] + [column for column in combined.columns if column != SHEET_COLUMN]]
@@ -0,0 +1,233 @@
+"""Traitement complet d'une nomenclature et de ses rapports, sans interface.
+
+Partagé par l'application Streamlit et le service HTTP : les fichiers sont
+des objets ouverts en binaire ayant un attribut `name` (téléversements ou
+fichiers sur disque), la progression passe par un `jobs.Job` et aucune
+fonction n'appelle Streamlit.
+"""
+from columnar_export import columnar_frame, export_tables, report_table, table_bytes, table_file_names
+from completion import apply_report_data, has_report_data, report_components
+from excel_export import export_nomenclature, export_workbook, updated_file_name
+from history import board_name, combined_hash, record_run
+from incremental import patch_workbook, TRACKED_COLUMNS
+from instrumentation import StageMetrics
+from multi_sheet import EMPTY_REPORT, combined_frame, complete_sheets, sheet_reports
+from preview import changed_rows
+from report_cache import cached_component_index, cached_report_data, cached_nomenclature, cached_sheets, content_hash
+from report_merge import DEFAULT_POLICY, merge_reports, read_reports
+
+
+def report_counts(report_data):
+    return {
+        "coverage": len(report_data['coverage']),
+        "notest": len(report_data['notest']),
+        # Un composant peut figurer sur plusieurs lignes PMSG d'un même rapport
+        "pmsg_not_used": len(set(report_data['pmsg_not_used'])),
+        "pass_tests": len(report_data.get('pass_tests', {})),
+    }
+
+
+def read_report_files(job, text_files, cache, policy=DEFAULT_POLICY, metrics=None):
+    """Analyse (avec cache) et fusionne les rapports ; retourne les données fusionnées."""
+    metrics = metrics or StageMetrics(enabled=False)
+
+    def parse(text_file):
+        # Un seul rapport hors archive : pas de nom dans l'étape
+        single = len(text_files) == 1 and text_file is text_files[0]
+        stage = "Analyse du rapport" if single else f"Analyse du rapport ({text_file.name})"
+        return cached_report_data(text_file, cache, progress=job.progress_callback(stage))
+
+    # Les rapports (y compris ceux des archives zip) sont analysés simultanément
+    # puis fusionnés composant par composant
+    with metrics.stage("Analyse du rapport"):
+        reports = read_reports(text_files, parse=parse, content_hash=content_hash)
+        if not reports:
+            raise ValueError("Aucun rapport dans les fichiers fournis")
+        return merge_reports(reports, policy)
+
+
+def update_excel_with_data(excel_file, report_data, cache, metrics=None, job=None):
+    """Nomenclature (avec cache) complétée par les statuts du rapport.
+
+    Retourne le DataFrame, les couleurs PPVS par ligne, le nombre de
+    composants traités, le masque des lignes modifiées par le rapport et les
+    repères sans correspondance ({"nomenclature": [...], "report": [...]}).
+    """
+    metrics = metrics or StageMetrics(enabled=False)
+    with metrics.stage("Lecture de la nomenclature"):
+        df = cached_nomenclature(excel_file, cache)
+        # Index des repères normalisés et plages développées, construit une fois par nomenclature
+        index = cached_component_index(excel_file, df, cache)
+    # Valeurs d'origine des colonnes recalculées, pour repérer les lignes modifiées par le rapport
+    before = df.reindex(columns=TRACKED_COLUMNS)
+
+    # Jointure vectorisée des statuts du rapport avec la nomenclature
+    with metrics.stage("Jointure des statuts"):
+        df, format_info, processed_count = apply_report_data(df, report_data, index)
+        changed = changed_rows(before, df)
+        bom_only, report_only = index.unmatched(report_components(report_data))
+    if job is not None:
+        job.report("Jointure des statuts", int((format_info != "").sum()), len(df))
+
+    return df, format_info, processed_count, changed, {"nomenclature": bom_only, "report": report_only}
+
+
+def process_files(job, excel_file, text_files, policy, incremental, cache, metrics=None, history_path=None,
+                  table_format=None, write_xlsx=True):
+    """Traitement complet d'une nomenclature et de ses rapports, exécuté dans un job.
+
+    Retourne un dictionnaire : compteurs du rapport, puis selon le mode le
+    DataFrame complété, le masque des lignes modifiées et les repères sans
+    correspondance (`unmatched`), ou la liste des modifications (mode
+    incrémental), et le classeur produit (`output`, en
+    octets) avec son nom de fichier. Avec `table_format` ("parquet", "arrow"
+    ou "csv"), `tables` contient aussi la nomenclature et la table du
+    rapport dans ce format ; sans `write_xlsx`, le classeur n'est pas produit
+    (`output` vaut None).
+    """
+    metrics = metrics or StageMetrics(enabled=False)
+    report_data = read_report_files(job, text_files, cache, policy, metrics)
+
+    result = {
+        "report_counts": report_counts(report_data),
+        "has_data": has_report_data(report_data),
+        "report_names": [text_file.name for text_file in text_files],
+        "policy": policy,
+    }
+
+    if not result["has_data"]:
+        return result
+
+    # Statuts par composant conservés dans l'historique, sans les fichiers eux-mêmes
+    if history_path:
+        job.report("Historique")
+        with metrics.stage("Historique"):
+            report_hash = combined_hash([content_hash(text_file) for text_file in text_files], policy)
+            record_run(report_data, board_name(excel_file.name), report_hash,
+                       ", ".join(result["report_names"]), path=history_path)
+
+    if incremental and excel_file.name.endswith('.xlsx'):
+        # Ne réécrire que les cellules dont le statut a changé
+        job.report("Mise à jour incrémentale")
+        excel_file.seek(0)
+        with metrics.stage("Mise à jour incrémentale"):
+            output, changes = patch_workbook(excel_file, report_data)
+        result.update(incremental=True, changes=changes, output=output.getvalue(), file_name=excel_file.name)
+        if table_format:
+            # Le classeur existant n'est pas relu : seule la table du rapport est exportée
+            with metrics.stage("Export en colonnes"):
+                result["tables"] = {"report": table_bytes(report_table(report_data), table_format)}
+            result["table_file_names"] = table_file_names(excel_file.name, table_format)
+        return result
+
+    # Réinitialiser le curseur du fichier Excel
+    excel_file.seek(0)
+    updated_df, format_info, processed_count, changed, unmatched = update_excel_with_data(
+        excel_file, report_data, cache, metrics, job)
+
+    output = None
+    if write_xlsx:
+        # Écrire le classeur formaté en flux (styles partagés, mode écriture seule)
+        with metrics.stage("Export Excel"):
+            output = export_nomenclature(updated_df, format_info,
+                                         progress=job.progress_callback("Export Excel")).getvalue()
+    if table_format:
+        job.report("Export en colonnes")
+        with metrics.stage("Export en colonnes"):
+            result["tables"] = export_tables(updated_df, report_data, table_format)
+        result["table_file_names"] = table_file_names(excel_file.name, table_format)
+
+    result.update(
+        incremental=False,
+        df=updated_df,
+        changed=changed,
+        processed_count=processed_count,
+        unmatched=unmatched,
+        output=output,
+        # Déterminer le nom du fichier de sortie
+        file_name=updated_file_name(excel_file.name),
+    )
+    return result
+
+
+def process_workbook(job, excel_file, text_files, policy, cache, metrics=None, sheet_names=None, history_path=None,
+                     table_format=None, write_xlsx=True):
+    """Traitement d'un classeur de plusieurs nomenclatures (une feuille par carte), exécuté dans un job.
+
+    `sheet_names` limite le traitement à ces feuilles (par défaut toutes,
+    sauf Liste et Modifications). Chaque feuille est complétée avec les
+    rapports portant son nom, sinon avec les rapports communs, fusionnés
+    selon `policy` ; les feuilles sont complétées simultanément. Retourne un
+    dictionnaire comme `process_files`, où `sheets` donne pour chaque feuille
+    le DataFrame complété, le masque des lignes modifiées, le nombre de
+    composants traités, les repères sans correspondance et les rapports
+    utilisés. `output` est un seul classeur conservant les feuilles ; avec
+    `table_format`, `tables` contient toutes les feuilles dans une même
+    table (colonne FEUILLE).
+    """
+    metrics = metrics or StageMetrics(enabled=False)
+    job.report("Lecture des feuilles")
+    with metrics.stage("Lecture de la nomenclature"):
+        sheets = cached_sheets(excel_file, cache, sheet_names)
+    if not sheets:
+        raise ValueError("Aucune feuille à traiter dans le classeur")
+
+    # Un même groupe de rapports (les rapports communs) n'est analysé et fusionné qu'une fois
+    report_names = [text_file.name for text_file in text_files]
+    assignments = {name: tuple(positions) for name, positions in sheet_reports(list(sheets), report_names).items()}
+    report_data_by_group = {}
+    with metrics.stage("Analyse du rapport"):
+        for group in dict.fromkeys(assignments.values()):
+            if group:
+                report_data_by_group[group] = read_report_files(job, [text_files[position] for position in group],
+                                                                cache, policy)
+
+    counts = [report_counts(report_data) for report_data in report_data_by_group.values()]
+    result = {
+        "report_counts": {key: sum(count[key] for count in counts) for key in report_counts(EMPTY_REPORT)},
+        "has_data": any(has_report_data(report_data) for report_data in report_data_by_group.values()),
+        "report_names": report_names,
+        "policy": policy,
+    }
+    if not result["has_data"]:
+        return result
+
+    if history_path:
+        job.report("Historique")
+        with metrics.stage("Historique"):
+            board = board_name(excel_file.name)
+            for group, report_data in report_data_by_group.items():
+                report_hash = combined_hash([content_hash(text_files[position]) for position in group], policy)
+                # Les feuilles sans colonne COMP. (notes, sommaire) ne sont pas des cartes
+                for name in (name for name, positions in assignments.items()
+                             if positions == group and "COMP." in sheets[name].columns):
+                    record_run(report_data, f"{board} - {name}", report_hash,
+                               ", ".join(report_names[position] for position in group), path=history_path)
+
+    # Jointure de chaque feuille avec son rapport, sur un pool de threads
+    with metrics.stage("Jointure des statuts"):
+        results = complete_sheets(sheets, {name: report_data_by_group.get(group) for name, group in assignments.items()},
+                                  progress=job.progress_callback("Jointure des feuilles"))
+    for name, sheet in results.items():
+        sheet["report_names"] = [report_names[position] for position in assignments[name]]
+
+    output = None
+    if write_xlsx:
+        # Un seul classeur : une feuille par nomenclature, un onglet Liste commun
+        with metrics.stage("Export Excel"):
+            output = export_workbook({name: (sheet["df"], sheet["format_info"]) for name, sheet in results.items()},
+                                     progress=job.progress_callback("Export Excel")).getvalue()
+    if table_format:
+        job.report("Export en colonnes")
+        with metrics.stage("Export en colonnes"):
+            result["tables"] = {"nomenclature": table_bytes(columnar_frame(combined_frame(results)), table_format)}
+        result["table_file_names"] = table_file_names(excel_file.name, table_format)
+
+    result.update(
+        incremental=False,
+        sheets=results,
+        processed_count=sum(sheet["processed_count"] for sheet in results.values()),
+        output=output,
+        file_name=updated_file_name(excel_file.name),
+    )
+    return result
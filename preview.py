@@ -0,0 +1,121 @@
+"""Aperçu paginé et filtrable du résultat, calculé côté serveur.
+
+L'index est construit une seule fois par traitement : codes des statuts
+PPVS, lignes modifiées par le rapport et composants triés pour la recherche
+par préfixe. Chaque filtre ne produit qu'un tableau de numéros de lignes ;
+seule la page affichée est extraite du DataFrame et envoyée au navigateur.
+"""
+import numpy as np
+import pandas as pd
+
+from incremental import TRACKED_COLUMNS
+
+DEFAULT_PAGE_SIZE = 100
+PAGE_SIZES = [50, 100, 500, 1000]
+# Libellé des lignes sans statut PPVS (composants absents du rapport)
+NO_STATUS = "(aucun)"
+
+
+def _comparable(column, values):
+    # Valeurs comparables avant/après la jointure : la couverture en fraction, arrondie
+    values = pd.Series(values, dtype=object).reset_index(drop=True)
+    if column != "COVERAGE %":
+        return values
+    text = values.astype(str).str.strip()
+    numeric = pd.to_numeric(text.str.rstrip("%"), errors="coerce")
+    numeric = numeric.where(~text.str.endswith("%"), numeric / 100).round(6)
+    return numeric.astype(object).where(numeric.notna(), values)
+
+
+def changed_rows(before, after, columns=TRACKED_COLUMNS):
+    """Masque des lignes dont au moins une colonne suivie a changé entre `before` et `after`."""
+    changed = np.zeros(len(after), dtype=bool)
+    missing = pd.Series([None] * len(after), dtype=object)
+    for column in columns:
+        old = before[column] if column in before else missing
+        new = after[column] if column in after else missing
+        old_missing = old.isna().to_numpy()
+        new_missing = new.isna().to_numpy()
+        changed |= old_missing != new_missing
+        # Seules les valeurs brutes différentes sont normalisées puis comparées
+        both = ~old_missing & ~new_missing
+        candidates = np.flatnonzero(both & (old.to_numpy(dtype=object) != new.to_numpy(dtype=object)))
+        if len(candidates):
+            old_values = _comparable(column, old.to_numpy(dtype=object)[candidates]).to_numpy()
+            new_values = _comparable(column, new.to_numpy(dtype=object)[candidates]).to_numpy()
+            changed[candidates[old_values != new_values]] = True
+    return changed
+
+
+class PreviewIndex:
+    """Filtres et pagination d'un DataFrame de résultat sans en copier les lignes.
+
+    `changed` est le masque des lignes modifiées par le rapport (None si
+    sans objet) ; les colonnes absentes désactivent le filtre correspondant.
+    """
+
+    def __init__(self, df, changed=None, status_column="PPVS", component_column="COMP."):
+        self.df = df
+        self.changed = None if changed is None else np.asarray(changed, dtype=bool)
+
+        self.statuses = []
+        self._status_codes = None
+        if status_column in df.columns:
+            status = df[status_column].astype(object)
+            status = status.where(status.notna() & status.astype(str).str.strip().ne(""), NO_STATUS).astype(str)
+            codes, self.statuses = pd.factorize(status, sort=True)
+            self.statuses = list(self.statuses)
+            self._status_codes = codes
+
+        self._component_order = None
+        if component_column in df.columns:
+            # Composants triés : un préfixe correspond à une plage contiguë (recherche dichotomique)
+            components = df[component_column].astype(str).str.strip().str.upper().to_numpy(dtype=str)
+            self._component_order = np.argsort(components, kind="stable")
+            self._sorted_components = components[self._component_order]
+
+    @property
+    def has_status(self):
+        return self._status_codes is not None
+
+    @property
+    def has_components(self):
+        return self._component_order is not None
+
+    def select(self, statuses=None, changed_only=False, prefix=""):
+        """Numéros des lignes retenues par les filtres, dans l'ordre du DataFrame."""
+        mask = np.ones(len(self.df), dtype=bool)
+        if statuses and self.has_status:
+            wanted = [self.statuses.index(status) for status in statuses if status in self.statuses]
+            mask &= np.isin(self._status_codes, wanted)
+        if changed_only and self.changed is not None:
+            mask &= self.changed
+        prefix = prefix.strip().upper()
+        if prefix and self.has_components:
+            start = np.searchsorted(self._sorted_components, prefix, side="left")
+            end = np.searchsorted(self._sorted_components, prefix + "\U0010ffff", side="left")
+            matching = np.zeros(len(self.df), dtype=bool)
+            matching[self._component_order[start:end]] = True
+            mask &= matching
+        return np.flatnonzero(mask)
+
+    def page(self, rows, number, size=DEFAULT_PAGE_SIZE):
+        # Seules les lignes de la page sont extraites
+        start = (number - 1) * size
+        return self.df.iloc[rows[start:start + size]]
+
+    def summary(self, rows=None):
+        """Nombre de lignes par statut PPVS, et parmi elles celles modifiées par le rapport."""
+        if not self.has_status:
+            return pd.DataFrame(columns=["Statut PPVS", "Lignes", "Modifiées"])
+        codes = self._status_codes if rows is None else self._status_codes[rows]
+        counts = np.bincount(codes, minlength=len(self.statuses))
+        summary = pd.DataFrame({"Statut PPVS": self.statuses, "Lignes": counts})
+        if self.changed is not None:
+            changed = self.changed if rows is None else self.changed[rows]
+            summary["Modifiées"] = np.bincount(codes, weights=changed, minlength=len(self.statuses)).astype(int)
+        return summary
+
+
+def page_count(row_count, size=DEFAULT_PAGE_SIZE):
+    return max(1, -(-row_count // size))
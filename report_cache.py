@@ -0,0 +1,142 @@
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+from bom_loader import read_excel_sheets, read_nomenclature
+from component_index import ComponentIndex
+from ingestion import ArchiveMember, read_report
+
+# Taille maximale du cache en mémoire (Mo), configurable par variable d'environnement
+DEFAULT_CACHE_MB = int(os.environ.get("EXCEL_COMPLETER_CACHE_MB", "512"))
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class LRUCache:
+    """Cache partagé entre sessions, borné en octets, avec éviction LRU.
+
+    Les tailles sont des estimations fournies à l'insertion ; une entrée plus
+    grande que la capacité totale n'est pas conservée.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            # Éviction des entrées les moins récemment utilisées
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+def content_hash(uploaded_file):
+    # SHA-256 du contenu, calculé par blocs sans copier le fichier
+    digest = hashlib.sha256()
+    if hasattr(uploaded_file, "getbuffer"):
+        digest.update(uploaded_file.getbuffer())
+    else:
+        uploaded_file.seek(0)
+        for block in iter(lambda: uploaded_file.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+def _report_size(report_data):
+    # Estimation de l'empreinte mémoire des dictionnaires du rapport
+    size = 0
+    for values in report_data.values():
+        size += sys.getsizeof(values)
+        for item in values:
+            size += sys.getsizeof(item)
+    size += sum(sys.getsizeof(comment) for comment in report_data["notest"].values())
+    return size
+
+
+def cached_report_data(text_file, cache, progress=None):
+    """Rapport analysé, mis en cache par empreinte SHA-256 du fichier.
+
+    Le dictionnaire retourné est partagé avec le cache : il ne doit pas être modifié.
+    """
+    if isinstance(text_file, ArchiveMember):
+        # Rapport d'une archive : empreinte de l'archive et nom du rapport
+        key = ("report", text_file.archive_hash, text_file.member)
+    else:
+        key = ("report", content_hash(text_file))
+    report_data = cache.get(key)
+    if report_data is None:
+        report_data = read_report(text_file, progress=progress)
+        cache.put(key, report_data, _report_size(report_data))
+    return report_data
+
+
+def cached_nomenclature(excel_file, cache):
+    """Nomenclature lue, mise en cache par empreinte SHA-256 ; retourne une copie modifiable."""
+    # L'extension fait partie de la clé : elle détermine le format de lecture
+    key = ("bom", content_hash(excel_file), os.path.splitext(excel_file.name)[1].lower())
+    df = cache.get(key)
+    if df is None:
+        df = read_nomenclature(excel_file)
+        cache.put(key, df, int(df.memory_usage(deep=True).sum()))
+    return df.copy()
+
+
+def cached_component_index(excel_file, df, cache):
+    """Index des repères de la nomenclature `df` lue depuis `excel_file`, construit une fois par contenu."""
+    key = ("index", content_hash(excel_file), os.path.splitext(excel_file.name)[1].lower())
+    index = cache.get(key)
+    if index is None:
+        index = ComponentIndex(df["COMP."] if "COMP." in df.columns else [])
+        cache.put(key, index, int(index.keys.nbytes + index.rows.nbytes + sum(sys.getsizeof(key) for key in index.keys)))
+    return index
+
+
+def cached_sheets(excel_file, cache, sheet_names=None):
+    """Feuilles d'un classeur lues en une seule ouverture, mises en cache ; retourne des copies modifiables."""
+    key = ("sheets", content_hash(excel_file), None if sheet_names is None else tuple(sheet_names))
+    sheets = cache.get(key)
+    if sheets is None:
+        sheets = read_excel_sheets(excel_file, sheet_names)
+        cache.put(key, sheets, sum(int(df.memory_usage(deep=True).sum()) for df in sheets.values()))
+    return {name: df.copy() for name, df in sheets.items()}
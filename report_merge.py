@@ -0,0 +1,118 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from ingestion import close_archives, expand_archives, is_on_disk, read_report
+from instrumentation import measured
+
+# Règles de fusion proposées, de la plus permissive à la plus simple
+MERGE_POLICIES = {
+    "max_coverage": "Couverture maximale",
+    "ok_beats_notest": "Un test OK l'emporte sur NOTEST",
+    "latest": "Le dernier rapport l'emporte",
+}
+DEFAULT_POLICY = "max_coverage"
+
+
+def _union(reports):
+    # Couverture la plus haute, commentaire NOTEST du dernier rapport, PMSG et PASS cumulés
+    # (un composant présent dans plusieurs rapports n'est compté qu'une fois)
+    merged = {"coverage": {}, "notest": {}, "pmsg_not_used": [], "pass_tests": {}}
+    coverage = merged["coverage"]
+    for report in reports:
+        for component, value in report["coverage"].items():
+            if component not in coverage or value > coverage[component]:
+                coverage[component] = value
+        merged["notest"].update(report["notest"])
+        merged["pmsg_not_used"].extend(report["pmsg_not_used"])
+        merged["pass_tests"].update(report.get("pass_tests", {}))
+    merged["pmsg_not_used"] = list(dict.fromkeys(merged["pmsg_not_used"]))
+    return merged
+
+
+def _latest(reports):
+    # Chaque composant reprend tous ses statuts du dernier rapport qui le mentionne
+    merged = {"coverage": {}, "notest": {}, "pmsg_not_used": [], "pass_tests": {}}
+    claimed = set()
+    for report in reversed(reports):
+        pmsg = set(report["pmsg_not_used"])
+        mentioned = [
+            component
+            for component in dict.fromkeys([*report["coverage"], *report["notest"],
+                                            *report["pmsg_not_used"], *report.get("pass_tests", {})])
+            if component not in claimed
+        ]
+        for component in mentioned:
+            if component in report["coverage"]:
+                merged["coverage"][component] = report["coverage"][component]
+            if component in report["notest"]:
+                merged["notest"][component] = report["notest"][component]
+            if component in pmsg:
+                merged["pmsg_not_used"].append(component)
+            if component in report.get("pass_tests", {}):
+                merged["pass_tests"][component] = True
+        claimed.update(mentioned)
+    merged["pmsg_not_used"] = list(dict.fromkeys(merged["pmsg_not_used"]))
+    return merged
+
+
+def merge_reports(reports, policy=DEFAULT_POLICY):
+    """Fusionne les données de plusieurs rapports d'une même carte, dans l'ordre donné.
+
+    Le résultat a le même format que celui d'`extract_data_from_report` :
+    les priorités de la jointure (couverture > SOUS-TEST > NOTEST > PASS)
+    s'appliquent ensuite comme pour un seul rapport.
+    """
+    if policy not in MERGE_POLICIES:
+        raise ValueError(f"Règle de fusion inconnue: {policy} (possibles: {', '.join(MERGE_POLICIES)})")
+    if len(reports) == 1:
+        return reports[0]
+    if policy == "latest":
+        return _latest(reports)
+
+    if policy == "ok_beats_notest":
+        reports = _without_tested_elsewhere(reports)
+    return _union(reports)
+
+
+def _without_tested_elsewhere(reports):
+    # Un composant testé OK par un programme n'est plus signalé NOTEST par les autres ;
+    # les priorités propres à chaque rapport restent inchangées
+    tested = [set(report["coverage"]) | set(report.get("pass_tests", {})) for report in reports]
+    filtered = []
+    for index, report in enumerate(reports):
+        elsewhere = set().union(*(components for other, components in enumerate(tested) if other != index))
+        filtered.append({
+            **report,
+            "notest": {c: comment for c, comment in report["notest"].items() if c not in elsewhere},
+            "pmsg_not_used": [c for c in report["pmsg_not_used"] if c not in elsewhere],
+        })
+    return filtered
+
+
+def read_reports(sources, parse=None, workers=None, content_hash=None):
+    """Analyse plusieurs rapports simultanément, en conservant leur ordre.
+
+    Chaque archive zip est remplacée par les rapports qu'elle contient. Les
+    chemins sont analysés sur un pool de processus ; les fichiers ouverts
+    (téléversements) sont passés à `parse` (par défaut `read_report`) sur un
+    pool de threads. `content_hash` calcule l'empreinte des archives
+    ouvertes, clé de cache de leurs rapports.
+    """
+    sources = expand_archives(sources, content_hash)
+    if not sources:
+        return []
+    try:
+        return _read_sources(sources, parse, workers)
+    finally:
+        close_archives(sources)
+
+
+def _read_sources(sources, parse, workers):
+    workers = min(workers or os.cpu_count() or 1, len(sources))
+    if workers == 1:
+        return [(parse or read_report)(source) for source in sources]
+    if parse is None and all(is_on_disk(source) for source in sources):
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(read_report, sources))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(measured(parse or read_report), sources))
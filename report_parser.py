@@ -0,0 +1,225 @@
+import re
+
+# Motifs appliqués directement sur les octets du rapport
+SUMMARY_PATTERN = re.compile(rb'Test Summary for ([A-Z]+\d+)')
+PERCENT_PATTERN = re.compile(rb'(\d+\.\d+)%')
+NOTEST_PATTERN = re.compile(rb'([A-Z]+\d+)\s+\(COMPONENT IS TESTED IN PARALLEL WITH ([A-Z]+\d+)\)\s+NOTEST')
+PMSG_PATTERN = re.compile(rb'([A-Z]+\d+)\s+\(PMSG is not used\)')
+UNITS_PATTERN = re.compile(rb'\*([A-Z]+\d+(?:_[A-Z]+\d*)*)\s+Units')
+# Le comptage des tests exige un blanc après PASS/FAIL, pas la lecture du résultat
+COUNTED_RESULT_PATTERN = re.compile(rb'(?:PASS|FAIL)\s')
+RESULT_PATTERN = re.compile(rb'PASS|FAIL')
+# Début de ligne ouvrant une section : points de découpe possibles du rapport
+SECTION_START_PATTERN = re.compile(rb'^[ \t]*(?:Test Summary for [A-Z]|\*[A-Z]+\d|Untested Devices)', re.MULTILINE)
+
+TOTALS_MARKER = b'Totals:'
+UNTESTED_MARKER = b'Untested Devices'
+GENERAL_SUMMARY_MARKER = b'General Summary Report'
+
+# Taille des blocs lus dans le flux (arrondie à la fin de ligne)
+BLOCK_SIZE = 1024 * 1024
+
+# États de la section "Untested Devices"
+UNTESTED_BEFORE = 0
+UNTESTED_INSIDE = 1
+UNTESTED_DONE = 2
+
+
+class ReportParser:
+    """Analyseur à états du rapport, alimenté par blocs de lignes entières.
+
+    Le rapport n'est lu qu'une seule fois : la couverture, les composants
+    NOTEST / PMSG not used et les tests PASS sont extraits dans la même passe,
+    sans jamais conserver le texte complet en mémoire. Chaque motif est
+    recherché directement à partir de la position courante, ce qui remplace
+    les `.*?` en mode DOTALL et leurs retours arrière.
+    """
+
+    def __init__(self):
+        self.coverage_data = {}
+        self.notest_data = {}
+        self.pmsg_not_used = []
+        self.component_test_counts = {}
+        self.passed_components = {}
+
+        # Bloc "Test Summary for" en attente de sa ligne "Totals:" puis de son pourcentage
+        self.summary_component = None
+        self.totals_seen = False
+        # Section "Untested Devices" (seule la première occurrence est lue)
+        self.untested_state = UNTESTED_BEFORE
+        # Blocs "*XXX Units" en attente de leur résultat PASS/FAIL
+        self.counted_test = None
+        self.result_test = None
+
+    def feed(self, block):
+        # Le bloc doit se terminer en fin de ligne : aucun motif n'est alors coupé
+        self._feed_coverage(block)
+        if self.untested_state != UNTESTED_DONE:
+            self._feed_untested(block)
+        self._feed_counted_tests(block)
+        self._feed_test_results(block)
+
+    def _feed_coverage(self, block):
+        pos = 0
+        while True:
+            if self.summary_component is None:
+                match = SUMMARY_PATTERN.search(block, pos)
+                if match is None:
+                    return
+                self.summary_component = match.group(1).decode('ascii')
+                self.totals_seen = False
+                pos = match.end()
+            elif not self.totals_seen:
+                index = block.find(TOTALS_MARKER, pos)
+                if index < 0:
+                    return
+                self.totals_seen = True
+                pos = index + len(TOTALS_MARKER)
+            else:
+                match = PERCENT_PATTERN.search(block, pos)
+                if match is None:
+                    return
+                self.coverage_data[self.summary_component] = float(match.group(1))
+                self.summary_component = None
+                pos = match.end()
+
+    def _feed_untested(self, block):
+        start = 0
+        if self.untested_state == UNTESTED_BEFORE:
+            index = block.find(UNTESTED_MARKER)
+            if index < 0:
+                return
+            self.untested_state = UNTESTED_INSIDE
+            start = index + len(UNTESTED_MARKER)
+
+        # La section s'arrête au premier "General Summary Report" qui la suit
+        end = block.find(GENERAL_SUMMARY_MARKER, start)
+        if end >= 0:
+            self.untested_state = UNTESTED_DONE
+        else:
+            end = len(block)
+
+        for component, tested_with in NOTEST_PATTERN.findall(block, start, end):
+            comment = f"COMPONENT IS TESTED IN PARALLEL WITH {tested_with.decode('ascii')}"
+            self.notest_data[component.decode('ascii')] = comment
+        for component in PMSG_PATTERN.findall(block, start, end):
+            self.pmsg_not_used.append(component.decode('ascii'))
+
+    def _feed_counted_tests(self, block):
+        pos = 0
+        while True:
+            if self.counted_test is None:
+                match = UNITS_PATTERN.search(block, pos)
+                if match is None:
+                    return
+                # Composant principal (avant le premier underscore)
+                self.counted_test = match.group(1).split(b'_')[0].decode('ascii')
+            else:
+                match = COUNTED_RESULT_PATTERN.search(block, pos)
+                if match is None:
+                    return
+                counts = self.component_test_counts
+                counts[self.counted_test] = counts.get(self.counted_test, 0) + 1
+                self.counted_test = None
+            pos = match.end()
+
+    def _feed_test_results(self, block):
+        pos = 0
+        while True:
+            if self.result_test is None:
+                match = UNITS_PATTERN.search(block, pos)
+                if match is None:
+                    return
+                self.result_test = match.group(1).split(b'_')[0].decode('ascii')
+            else:
+                match = RESULT_PATTERN.search(block, pos)
+                if match is None:
+                    return
+                if match.group(0) == b'PASS':
+                    self.passed_components[self.result_test] = True
+                self.result_test = None
+            pos = match.end()
+
+    def is_idle(self):
+        # Aucun bloc "Test Summary for" ni "*XXX Units" en attente de la suite
+        return self.summary_component is None and self.counted_test is None and self.result_test is None
+
+    def can_absorb(self, other):
+        """Indique si `other`, analysé à partir d'un état vierge, prolonge exactement cet analyseur."""
+        if not self.is_idle():
+            return False
+        if self.untested_state == UNTESTED_BEFORE:
+            return True
+        # Section "Untested Devices" déjà lue : la suite ne doit pas en contenir une autre
+        return self.untested_state == UNTESTED_DONE and other.untested_state == UNTESTED_BEFORE
+
+    def absorb(self, other):
+        # Mêmes règles que l'analyse en série : la dernière valeur l'emporte, les comptes s'additionnent
+        self.coverage_data.update(other.coverage_data)
+        self.notest_data.update(other.notest_data)
+        self.pmsg_not_used.extend(other.pmsg_not_used)
+        counts = self.component_test_counts
+        for component, count in other.component_test_counts.items():
+            counts[component] = counts.get(component, 0) + count
+        self.passed_components.update(other.passed_components)
+
+        self.summary_component = other.summary_component
+        self.totals_seen = other.totals_seen
+        self.counted_test = other.counted_test
+        self.result_test = other.result_test
+        if self.untested_state == UNTESTED_BEFORE:
+            self.untested_state = other.untested_state
+
+    def result(self):
+        # Seuls les composants n'ayant qu'un seul test, et PASS, sont retenus
+        pass_tests = {
+            component: True
+            for component in self.passed_components
+            if self.component_test_counts.get(component, 0) == 1
+        }
+        return {
+            "coverage": self.coverage_data,
+            "notest": self.notest_data,
+            "pmsg_not_used": self.pmsg_not_used,
+            "pass_tests": pass_tests
+        }
+
+
+def iter_line_blocks(stream, block_size=BLOCK_SIZE):
+    # Blocs d'environ block_size octets, complétés jusqu'à la fin de ligne suivante
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            return
+        if not block.endswith(b'\n'):
+            block += stream.readline()
+        yield block
+
+
+def split_report(buffer, chunk_count):
+    """Découpe le rapport en plages d'octets [début, fin) commençant chacune par une section.
+
+    Les découpes tombent au début d'une ligne "Test Summary for", "*XXX Units"
+    ou "Untested Devices" ; les plages sans début de section sont fusionnées.
+    """
+    size = len(buffer)
+    boundaries = [0]
+    for index in range(1, chunk_count):
+        match = SECTION_START_PATTERN.search(buffer, max(size * index // chunk_count, boundaries[-1] + 1))
+        if match is None:
+            break
+        boundaries.append(match.start())
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+
+def parse_report_stream(stream, block_size=BLOCK_SIZE):
+    parser = ReportParser()
+    for block in iter_line_blocks(stream, block_size):
+        parser.feed(block)
+    return parser.result()
+
+
+def extract_data_from_report(text_file):
+    # Le fichier est lu en binaire par blocs de lignes : il n'est jamais décodé en entier
+    return parse_report_stream(text_file)
@@ -0,0 +1,382 @@
+"""Service HTTP local de complétion des nomenclatures, pour les intégrations (MES...).
+
+Exemples :
+    python server.py --port 8765 -j 4 --root /data
+    curl -F bom=@carte.xlsx -F report=@carte.txt http://127.0.0.1:8765/process -o carte_updated.xlsx
+    curl -F bom=@carte.xlsx -F report=@analog.txt -F report=@functional.txt -F policy=latest \\
+         "http://127.0.0.1:8765/process?format=json"
+    curl -d '{"bom": "/data/carte.xlsx", "reports": ["/data/carte.txt"], "output": "/data/carte_updated.xlsx"}' \\
+         -H "Content-Type: application/json" http://127.0.0.1:8765/process
+
+POST /process accepte soit un envoi multipart (champs "bom" et "report",
+ce dernier répétable, plus "policy", "incremental", "history", "format" et
+"sheets"),
+soit un JSON désignant des fichiers locaux ("bom", "reports", "output"...),
+ce qui évite de transférer les très gros rapports. Les chemins locaux (y
+compris "output") ne sont acceptés que dans les dossiers --root ; sans
+--root, seuls les envois multipart sans "output" sont traités. La réponse est le
+classeur complété (format=xlsx, par défaut), un état JSON (format=json,
+par défaut lorsqu'un "output" est demandé) ou, sans produire de classeur, la
+nomenclature complétée en Parquet, Arrow IPC ou CSV (format=parquet, arrow
+ou csv ; table=report pour la table du rapport). Avec sheets=* (ou une liste
+de feuilles séparées par des virgules), la nomenclature est un classeur
+d'une carte par feuille, chacune complétée avec le rapport portant son nom.
+GET /health retourne l'état du service et de son cache.
+
+Le processus reste démarré : les bibliothèques sont importées une fois, un
+traitement d'échauffement compile les motifs et le modèle d'export, et les
+rapports et nomenclatures déjà reçus restent dans le cache LRU partagé.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+
+import pipeline
+from columnar_export import TABLE_FORMATS, TABLE_MIME_TYPES
+from excel_export import MIME_XLSX
+from history import DEFAULT_HISTORY_PATH
+from instrumentation import StageMetrics
+from jobs import DEFAULT_JOB_WORKERS, JobManager
+from multi_sheet import ALL_SHEETS
+from report_cache import LRUCache, DEFAULT_CACHE_MB
+from report_merge import MERGE_POLICIES, DEFAULT_POLICY
+
+DEFAULT_HOST = os.environ.get("EXCEL_COMPLETER_HOST", "127.0.0.1")
+DEFAULT_PORT = int(os.environ.get("EXCEL_COMPLETER_PORT", "8765"))
+# Exemple fourni avec le dépôt, traité au démarrage pour échauffer le service
+WARMUP_FILES = ("Plan_de_Test_par_Composant - CEBB3_SA_SB.xlsx", "ANALYZEREPORT CEBB3_SA_SB.txt")
+TRUE_VALUES = ("1", "true", "yes", "oui", "on")
+
+
+class RequestError(Exception):
+    def __init__(self, message, status=HTTPStatus.BAD_REQUEST):
+        super().__init__(message)
+        self.status = status
+
+
+class UploadedFile(io.BytesIO):
+    # Fichier reçu, avec le nom attendu par le cache et le choix du lecteur
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+
+class CompletionService:
+    """Pool de traitements et cache partagés par toutes les requêtes."""
+
+    def __init__(self, workers=DEFAULT_JOB_WORKERS, cache_mb=DEFAULT_CACHE_MB, history_path=DEFAULT_HISTORY_PATH,
+                 roots=None):
+        self.manager = JobManager(max_workers=workers)
+        self.cache = LRUCache(max_bytes=cache_mb * 1024 * 1024)
+        self.workers = workers
+        self.history_path = history_path
+        # Dossiers dans lesquels les chemins des requêtes sont autorisés (aucun chemin local si vide)
+        self.roots = [os.path.realpath(root) for root in roots or []]
+
+    def warm_up(self, directory=os.path.dirname(os.path.abspath(__file__))):
+        paths = [os.path.join(directory, name) for name in WARMUP_FILES]
+        if not all(os.path.exists(path) for path in paths):
+            return None
+        start = time.perf_counter()
+        with open(paths[0], "rb") as bom, open(paths[1], "rb") as report:
+            self.process(bom, [report])
+        return time.perf_counter() - start
+
+    def process(self, bom, reports, policy=DEFAULT_POLICY, incremental=False, history=False, table_format=None,
+                sheet_names=None):
+        """Exécute le traitement dans le pool et retourne son résultat et ses durées par étape.
+
+        Avec `table_format`, seules les tables en colonnes sont produites, sans classeur formaté.
+        Avec `sheet_names` (liste ou ALL_SHEETS), chaque feuille du classeur est une carte.
+        """
+        if policy not in MERGE_POLICIES:
+            raise RequestError(f"Règle de fusion inconnue: {policy} (possibles: {', '.join(MERGE_POLICIES)})")
+        if table_format and incremental:
+            raise RequestError("Les formats en colonnes ne s'appliquent pas au mode incrémental")
+        if sheet_names is not None and incremental:
+            raise RequestError("Le mode incrémental ne traite que la première feuille")
+        metrics = StageMetrics(track_memory=False)
+        if sheet_names is not None:
+            job = self.manager.submit(
+                pipeline.process_workbook, bom, reports, policy, self.cache, metrics,
+                None if sheet_names == ALL_SHEETS else sheet_names,
+                self.history_path if history else None, table_format, table_format is None,
+            )
+            return job.result(), metrics
+        job = self.manager.submit(
+            pipeline.process_files, bom, reports, policy, incremental, self.cache, metrics,
+            self.history_path if history else None, table_format, table_format is None,
+        )
+        return job.result(), metrics
+
+    def allowed_path(self, path):
+        """Chemin réel de `path`, s'il se trouve dans l'un des dossiers --root."""
+        if not self.roots:
+            raise RequestError("Chemins locaux refusés : démarrer le service avec --root", HTTPStatus.FORBIDDEN)
+        real_path = os.path.realpath(str(path))
+        if not any(os.path.commonpath([real_path, root]) == root for root in self.roots):
+            raise RequestError(f"Chemin hors des dossiers autorisés: {path}", HTTPStatus.FORBIDDEN)
+        return real_path
+
+    def open_path(self, path):
+        real_path = self.allowed_path(path)
+        if not os.path.isfile(real_path):
+            raise RequestError(f"Fichier introuvable: {path}", HTTPStatus.NOT_FOUND)
+        return open(real_path, "rb")
+
+
+def _flag(value):
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def _sheet_names(value):
+    # "*" : toutes les feuilles ; "a,b" ou ["a", "b"] : ces feuilles ; absent : première feuille seulement
+    if value is None or value == "":
+        return None
+    if isinstance(value, list):
+        return [str(name) for name in value]
+    if value.strip() == ALL_SHEETS:
+        return ALL_SHEETS
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def _status(result, metrics, elapsed):
+    status = {
+        "has_data": result["has_data"],
+        "report_counts": result["report_counts"],
+        "report_names": result["report_names"],
+        "policy": result["policy"],
+        "timings": metrics.timings(),
+        "elapsed": elapsed,
+    }
+    if not result["has_data"]:
+        return status
+    status["file_name"] = os.path.basename(result["file_name"])
+    if "sheets" in result:
+        status["rows"] = sum(len(sheet["df"]) for sheet in result["sheets"].values())
+        status["processed_count"] = result["processed_count"]
+        status["sheets"] = {
+            name: {
+                "rows": len(sheet["df"]),
+                "processed_count": sheet["processed_count"],
+                "changed_rows": int(sheet["changed"].sum()),
+                "report_names": [os.path.basename(report_name) for report_name in sheet["report_names"]],
+                "unmatched": sheet["unmatched"],
+            }
+            for name, sheet in result["sheets"].items()
+        }
+    elif result["incremental"]:
+        status["changes"] = len(result["changes"])
+    else:
+        status["rows"] = len(result["df"])
+        status["processed_count"] = result["processed_count"]
+        status["unmatched"] = result["unmatched"]
+        status["changed_rows"] = int(result["changed"].sum())
+    return status
+
+
+def _write_output(path, data):
+    # Écriture dans un fichier temporaire : un lecteur ne voit jamais de classeur incomplet
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as output:
+        output.write(data)
+    os.replace(temp_path, path)
+
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    server_version = "ExcelCompleter/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def do_GET(self):
+        if urlsplit(self.path).path != "/health":
+            self._send_json({"error": "Ressource inconnue"}, HTTPStatus.NOT_FOUND)
+            return
+        self._send_json({"status": "ok", "workers": self.service.workers, "cache": self.service.cache.stats()})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != "/process":
+            self._send_json({"error": "Ressource inconnue"}, HTTPStatus.NOT_FOUND)
+            return
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        files = []
+        try:
+            content_type = self.headers.get("Content-Type", "")
+            if content_type.startswith("multipart/form-data"):
+                options, bom, reports = self._read_multipart(content_type)
+            elif content_type.startswith("application/json"):
+                options, bom, reports = self._read_json()
+                files = [bom, *reports]
+            else:
+                raise RequestError("Envoi multipart/form-data ou application/json attendu",
+                                   HTTPStatus.UNSUPPORTED_MEDIA_TYPE)
+            options = {**options, **query}
+            output_path = options.get("output")
+            if output_path:
+                # Vérifié avant le traitement : aucun fichier n'est écrit hors des dossiers autorisés
+                output_path = self.service.allowed_path(output_path)
+            output_format = options.get("format", "json" if options.get("output") else "xlsx")
+            if output_format not in ("xlsx", "json", *TABLE_FORMATS):
+                raise RequestError(f"Format inconnu: {output_format} (possibles: xlsx, json, {', '.join(TABLE_FORMATS)})")
+            table_format = output_format if output_format in TABLE_FORMATS else None
+
+            start = time.perf_counter()
+            result, metrics = self.service.process(
+                bom, reports, options.get("policy", DEFAULT_POLICY),
+                _flag(options.get("incremental", "")), _flag(options.get("history", "")), table_format,
+                _sheet_names(options.get("sheets")),
+            )
+            status = _status(result, metrics, time.perf_counter() - start)
+        except RequestError as e:
+            self._send_json({"error": str(e)}, e.status)
+            return
+        except Exception as e:
+            self._send_json({"error": f"{e.__class__.__name__}: {e}"}, HTTPStatus.INTERNAL_SERVER_ERROR)
+            return
+        finally:
+            for file in files:
+                file.close()
+
+        if not result["has_data"]:
+            status["error"] = "aucune donnée trouvée dans le rapport"
+            self._send_json(status, HTTPStatus.UNPROCESSABLE_ENTITY)
+            return
+
+        if table_format:
+            table = options.get("table", "nomenclature")
+            if table not in result["tables"]:
+                self._send_json({"error": f"Table inconnue: {table} (possibles: nomenclature, report)"},
+                                HTTPStatus.BAD_REQUEST)
+                return
+            file_name = result["table_file_names"][table]
+            self._send_bytes(result["tables"][table], TABLE_MIME_TYPES[table_format], {
+                "Content-Disposition": f"attachment; filename*=UTF-8''{quote(os.path.basename(file_name))}",
+                "X-Elapsed": f"{status['elapsed']:.4f}",
+            })
+            return
+
+        if output_path:
+            _write_output(output_path, result["output"])
+            status["output"] = options["output"]
+        if output_format == "json":
+            self._send_json(status)
+            return
+        self._send_bytes(result["output"], MIME_XLSX, {
+            "Content-Disposition": f"attachment; filename*=UTF-8''{quote(status['file_name'])}",
+            "X-Elapsed": f"{status['elapsed']:.4f}",
+        })
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0:
+            raise RequestError("Corps de requête vide")
+        return self.rfile.read(length)
+
+    def _read_multipart(self, content_type):
+        message = BytesParser(policy=HTTP).parsebytes(
+            b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + self._read_body()
+        )
+        options, bom, reports = {}, None, []
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            file_name = part.get_filename()
+            data = part.get_payload(decode=True) or b""
+            if name == "bom" and file_name:
+                bom = UploadedFile(data, file_name)
+            elif name == "report" and file_name:
+                reports.append(UploadedFile(data, file_name))
+            elif name:
+                options[name] = data.decode("utf-8").strip()
+        if bom is None or not reports:
+            raise RequestError("Champs 'bom' et 'report' (fichiers) requis")
+        return options, bom, reports
+
+    def _read_json(self):
+        try:
+            request = json.loads(self._read_body())
+        except ValueError as e:
+            raise RequestError(f"JSON invalide: {e}")
+        reports = request.get("reports") or request.get("report")
+        if isinstance(reports, str):
+            reports = [reports]
+        if not request.get("bom") or not reports:
+            raise RequestError("Clés 'bom' et 'reports' (chemins) requises")
+        bom = self.service.open_path(request["bom"])
+        opened = [bom]
+        try:
+            for path in reports:
+                opened.append(self.service.open_path(path))
+        except RequestError:
+            for file in opened:
+                file.close()
+            raise
+        options = {key: value for key, value in request.items() if key not in ("bom", "reports", "report")}
+        return options, bom, opened[1:]
+
+    def _send_json(self, data, status=HTTPStatus.OK):
+        body = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+        self._send_bytes(body, "application/json; charset=utf-8", status=status)
+
+    def _send_bytes(self, body, content_type, headers=None, status=HTTPStatus.OK):
+        if status >= HTTPStatus.BAD_REQUEST:
+            # Le corps de la requête n'a peut-être pas été lu : la connexion n'est pas réutilisée
+            self.close_connection = True
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Service HTTP local de complétion des nomenclatures.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="adresse d'écoute (défaut : %(default)s)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port d'écoute (défaut : %(default)s)")
+    parser.add_argument("-j", "--jobs", type=int, default=DEFAULT_JOB_WORKERS,
+                        help="traitements simultanés (défaut : %(default)s)")
+    parser.add_argument("--cache-mb", type=int, default=DEFAULT_CACHE_MB,
+                        help="taille du cache des analyses en Mo (défaut : %(default)s)")
+    parser.add_argument("--history", metavar="BASE", default=DEFAULT_HISTORY_PATH,
+                        help="base SQLite utilisée par les requêtes avec history=1 (défaut : %(default)s)")
+    parser.add_argument("--root", action="append", metavar="DOSSIER",
+                        help="dossier autorisé pour les chemins des requêtes JSON et pour \"output\" "
+                             "(répétable ; sans --root, aucun chemin local n'est accepté)")
+    parser.add_argument("--no-warmup", action="store_true", help="ne pas traiter l'exemple au démarrage")
+    args = parser.parse_args(argv)
+
+    service = CompletionService(args.jobs, args.cache_mb, args.history, args.root)
+    if not args.no_warmup:
+        elapsed = service.warm_up()
+        if elapsed is not None:
+            print(f"Service échauffé en {elapsed:.2f} s", file=sys.stderr)
+
+    server = ThreadingHTTPServer((args.host, args.port), CompletionHandler)
+    server.service = service
+    print(f"Service à l'écoute sur http://{args.host}:{server.server_port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.manager.shutdown(wait=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
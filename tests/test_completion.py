@@ -0,0 +1,68 @@
+import pandas as pd
+
+from completion import apply_report_data
+
+
+def _report(coverage=None, notest=None, pmsg_not_used=None, pass_tests=None):
+    return {"coverage": coverage or {}, "notest": notest or {},
+            "pmsg_not_used": pmsg_not_used or [], "pass_tests": pass_tests or {}}
+
+
+def _complete(components, report_data):
+    df, format_info, processed_count = apply_report_data(pd.DataFrame({"COMP.": components}), report_data)
+    return df, list(format_info), processed_count
+
+
+def test_status_priorities():
+    # Couverture > NOTEST (SOUS-TEST) > PMSG not used (NOTEST) > test unique PASS
+    report_data = _report(
+        coverage={"U1": 87.5, "U2": 40.0},
+        notest={"U2": "COMPONENT IS TESTED IN PARALLEL WITH U9", "C1": "COMPONENT IS TESTED IN PARALLEL WITH C9"},
+        pmsg_not_used=["U1", "C1", "R1"],
+        pass_tests={"U1": True, "R1": True, "D1": True},
+    )
+    df, format_info, processed_count = _complete(["U1", "U2", "C1", "R1", "D1", "X1"], report_data)
+
+    assert df["COVERAGE %"].tolist() == ["87.50%", "40.00%", None, None, None, None]
+    assert df["PPVS"].tolist() == ["OK", "OK", "SOUS-TEST", "NOTEST", "OK", None]
+    assert df["REMARKS"].tolist() == [None, None, "COMPONENT IS TESTED IN PARALLEL WITH C9", None, None, None]
+    assert format_info == ["green", "green", "yellow", "red", "green", ""]
+    assert processed_count == 5
+
+
+def test_existing_values_kept_for_unmatched_rows():
+    df = pd.DataFrame({"COMP.": ["R1", "R2"], "PPVS": ["OK", "NOTEST"], "REMARKS": ["saisie", None]}, dtype=object)
+    df, format_info, _ = apply_report_data(df, _report(pmsg_not_used=["R1"]))
+    assert df["PPVS"].tolist() == ["NOTEST", "NOTEST"]
+    assert df["REMARKS"].tolist() == ["saisie", None]
+    assert list(format_info) == ["red", ""]
+
+
+def test_designators_normalized():
+    df, format_info, _ = _complete([" u010", "r1 "], _report(coverage={"U10": 50.0}, pmsg_not_used=["R01"]))
+    assert df["PPVS"].tolist() == ["OK", "NOTEST"]
+    assert format_info == ["green", "red"]
+
+
+def test_row_of_several_designators_takes_least_favourable_status():
+    report_data = _report(
+        coverage={"C3": 80.0, "C4": 60.0, "C5": 90.0},
+        notest={"U1": "COMPONENT IS TESTED IN PARALLEL WITH U9"},
+        pmsg_not_used=["U2"],
+        pass_tests={"D1": True, "D2": True},
+    )
+    df, format_info, _ = _complete(["C3,C4", "C5,U1", "U1,U2", "D1 D2", "C3-C5"], report_data)
+    assert df["PPVS"].tolist() == ["OK", "SOUS-TEST", "NOTEST", "OK", "OK"]
+    assert df["COVERAGE %"].tolist() == ["60.00%", None, None, None, "60.00%"]
+    assert format_info == ["green", "yellow", "red", "green", "green"]
+
+
+def test_designator_missing_from_report_counts_as_zero_coverage():
+    report_data = _report(coverage={"C3": 80.0}, notest={"U1": "COMPONENT IS TESTED IN PARALLEL WITH U9"},
+                          pass_tests={"D1": True})
+    df, format_info, processed_count = _complete(["C3,C4", "U1,U5", "D1,D9", "C8,C9"], report_data)
+    assert df["COVERAGE %"].tolist() == ["0.00%", None, "0.00%", None]
+    assert df["PPVS"].tolist() == ["OK", "SOUS-TEST", "OK", None]
+    # Aucun repère de la dernière ligne dans le rapport : elle n'est pas traitée
+    assert format_info == ["green", "yellow", "green", ""]
+    assert processed_count == 3
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from component_index import ComponentIndex, expand_designators, normalize_designator
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("U10", "U10"),
+    (" u010 ", "U10"),
+    ("R001", "R1"),
+    ("R100", "R100"),
+    ("J1-02", "J1-2"),
+])
+def test_normalize_designator(value, expected):
+    assert normalize_designator(value) == expected
+
+
+@pytest.mark.parametrize("cell, expected", [
+    ("C3,C4,C7", ["C3", "C4", "C7"]),
+    ("C3 C4;C4", ["C3", "C4"]),
+    ("R1-R5", ["R1", "R2", "R3", "R4", "R5"]),
+    # Broche ou sous-repère : pas une plage
+    ("J1-2", ["J1-2"]),
+    ("R1-5", ["R1-5"]),
+    ("R5-R1", ["R5-R1"]),
+    ("R1-C5", ["R1-C5"]),
+    ("R1-R3,C2", ["R1", "R2", "R3", "C2"]),
+])
+def test_expand_designators(cell, expected):
+    assert expand_designators(cell) == expected
+
+
+def test_index_rows_and_lookup():
+    index = ComponentIndex(["U1", "c3, C4", None, "", "R1-R3", "J1-2"])
+    assert index.row_count == 6
+    assert not index.one_per_row
+    assert list(zip(index.keys, index.rows)) == [
+        ("U1", 0), ("C3", 1), ("C4", 1), ("R1", 4), ("R2", 4), ("R3", 4), ("J1-2", 5),
+    ]
+    assert index.lookup("r02").tolist() == [4]
+    assert index.lookup("J2").tolist() == []
+    assert index.matching_rows(["C4", "R3", "Z9"]).tolist() == [1, 4]
+
+
+def test_one_designator_per_row():
+    index = ComponentIndex(["U1", "u2", "R010"])
+    assert index.one_per_row
+    assert index.keys.tolist() == ["U1", "U2", "R10"]
+    assert np.array_equal(index.rows, np.arange(3))
+
+
+def test_unmatched_components():
+    index = ComponentIndex(["U1", "C3,C4", "R1-R3"])
+    bom_only, report_only = index.unmatched(["u01", "C4", "R2", "Z9", "A1"])
+    assert bom_only == ["C3", "R1", "R3"]
+    # Tels qu'ils figurent dans le rapport, triés
+    assert report_only == ["A1", "Z9"]
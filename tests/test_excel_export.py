@@ -0,0 +1,39 @@
+import os
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+from excel_export import export_nomenclature, export_workbook, load_dropdown_columns
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "TEMPLATE.xlsx")
+
+
+def test_template_dropdowns_have_values():
+    dropdown_columns = load_dropdown_columns(TEMPLATE_PATH)
+    assert dropdown_columns["PPVS"] == ["OK", "SOUS-TEST", "NOTEST"]
+    # La colonne REMARKS de l'onglet Liste est vide : pas de menu déroulant
+    assert "REMARKS" not in dropdown_columns
+    assert all(dropdown_columns.values())
+
+
+def test_empty_dropdown_gets_no_validation():
+    df = pd.DataFrame({"COMP.": ["R1", "R2"], "PPVS": ["OK", None], "REMARKS": [None, "à revoir"]})
+    dropdown_columns = {"PPVS": ["OK", "SOUS-TEST", "NOTEST"], "REMARKS": []}
+    output = export_nomenclature(df, np.array(["green", ""], dtype=object), dropdown_columns=dropdown_columns)
+
+    workbook = load_workbook(output)
+    validations = {str(dv.sqref): dv.formula1 for dv in workbook["Nomenclature"].data_validations.dataValidation}
+    assert validations == {"B2:B3": "Liste!$A$2:$A$4"}
+
+
+def test_sheet_without_colors_is_copied_plain():
+    bom = pd.DataFrame({"COMP.": ["R1"], "PPVS": ["OK"]})
+    notes = pd.DataFrame({"TYPE": ["RES"], "COVERAGE %": ["85%"]})
+    output = export_workbook({"Carte": (bom, np.array(["green"], dtype=object)), "Notes": (notes, None)},
+                             dropdown_columns={"TYPE": ["RES", "CAP"], "PPVS": ["OK", "NOTEST"]})
+
+    worksheet = load_workbook(output)["Notes"]
+    assert [[cell.value for cell in row] for row in worksheet.iter_rows()] == [["TYPE", "COVERAGE %"], ["RES", "85%"]]
+    assert not worksheet.data_validations.dataValidation
+    assert not worksheet["A1"].font.b
@@ -0,0 +1,90 @@
+import io
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+from excel_export import export_nomenclature
+from incremental import CHANGELOG_COLUMNS, patch_workbook
+
+DROPDOWN_COLUMNS = {"TYPE": ["RES", "CAP"], "PPVS": ["OK", "SOUS-TEST", "NOTEST"]}
+
+
+def _report(coverage=None, pmsg_not_used=None):
+    return {"coverage": coverage or {}, "notest": {}, "pmsg_not_used": pmsg_not_used or [], "pass_tests": {}}
+
+
+def _completed_workbook():
+    df = pd.DataFrame({"COMP.": ["U1", "R1", "C1"], "TYPE": ["LOGIC", "RES", "CAP"],
+                       "PPVS": ["OK", "NOTEST", None], "COVERAGE %": ["75.00%", None, None],
+                       "REMARKS": [None, None, "saisie"]}, dtype=object)
+    return export_nomenclature(df, np.array(["green", "red", ""], dtype=object), dropdown_columns=DROPDOWN_COLUMNS)
+
+
+def test_unchanged_workbook_is_not_rewritten():
+    source = _completed_workbook()
+    output = io.BytesIO()
+    result, changes = patch_workbook(source, _report(coverage={"U1": 75.0}, pmsg_not_used=["R1"]), output)
+    assert result is source and result.tell() == 0
+    assert changes.empty and output.getvalue() == b""
+
+
+def test_only_changed_cells_are_written():
+    source = _completed_workbook()
+    output, changes = patch_workbook(source, _report(coverage={"U1": 50.0}, pmsg_not_used=["C1"]))
+    changes = changes.astype(object).where(changes.notna(), None)
+    assert changes.values.tolist() == [[2, "U1", "COVERAGE %", 0.75, 0.5], [4, "C1", "PPVS", None, "NOTEST"]]
+
+    workbook = load_workbook(output)
+    worksheet = workbook["Nomenclature"]
+    assert [[cell.value for cell in row] for row in worksheet.iter_rows()] == [
+        ["COMP.", "TYPE", "PPVS", "COVERAGE %", "REMARKS"],
+        ["U1", "LOGIC", "OK", 0.5, None],
+        ["R1", "RES", "NOTEST", None, None],
+        ["C1", "CAP", "NOTEST", None, "saisie"],
+    ]
+    assert worksheet["D2"].number_format == "0.00%" and worksheet["C4"].alignment.horizontal == "center"
+    assert worksheet["C4"].border.left.style == "thin"
+    # Menus déroulants et onglet Liste recopiés tels quels
+    assert {str(dv.sqref) for dv in worksheet.data_validations.dataValidation} == {"B2:B4", "C2:C4"}
+    assert workbook.sheetnames == ["Nomenclature", "Liste", "Modifications"]
+
+    changelog = [row[1:] for row in workbook["Modifications"].iter_rows(values_only=True)]
+    assert changelog == [tuple(CHANGELOG_COLUMNS[1:]), (2, "U1", "COVERAGE %", 0.75, 0.5),
+                         (4, "C1", "PPVS", None, "NOTEST")]
+    assert workbook["Modifications"]["A1"].font.b
+
+
+def test_changelog_is_appended():
+    first, _ = patch_workbook(_completed_workbook(), _report(coverage={"U1": 50.0}))
+    second, changes = patch_workbook(first, _report(coverage={"U1": 25.0}))
+    assert len(changes) == 1
+    changelog = list(load_workbook(second)["Modifications"].iter_rows(min_row=2, values_only=True))
+    assert [row[1:] for row in changelog] == [(2, "U1", "COVERAGE %", 0.75, 0.5), (2, "U1", "COVERAGE %", 0.5, 0.25)]
+
+
+def test_missing_columns_are_added_with_export_formatting():
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.title = "Nomenclature"
+    worksheet.append(["COMP.", "TYPE"])
+    worksheet.append(["U1", "LOGIC"])
+    worksheet.append(["R1", "RES"])
+    liste = workbook.create_sheet("Liste")
+    for row in [["TYPE", "PPVS"], ["RES", "OK"], ["CAP", "SOUS-TEST"], [None, "NOTEST"]]:
+        liste.append(row)
+    source = io.BytesIO()
+    workbook.save(source)
+
+    output, changes = patch_workbook(source, _report(coverage={"U1": 80.0}))
+    worksheet = load_workbook(output)["Nomenclature"]
+    assert [cell.value for cell in worksheet[1]] == ["COMP.", "TYPE", "COVERAGE %", "PPVS", "REMARKS"]
+    assert [[cell.value for cell in row] for row in worksheet.iter_rows(min_row=2)] == [
+        ["U1", "LOGIC", 0.8, "OK", None], ["R1", "RES", None, None, None]]
+    assert worksheet["E3"].font.name == "Aptos Narrow" and worksheet["E3"].border.left.style == "thin"
+    validations = {str(dv.sqref): dv.formula1 for dv in worksheet.data_validations.dataValidation}
+    assert validations == {"D2:D3": "Liste!$B$2:$B$4"}
+    rules = [(str(formatting.sqref), rule.formula) for formatting in worksheet.conditional_formatting
+             for rule in formatting.rules]
+    assert rules == [("D2:D3", ['"OK"']), ("D2:D3", ['"SOUS-TEST"']), ("D2:D3", ['"NOTEST"'])]
+    assert changes["Colonne"].tolist() == ["COVERAGE %", "PPVS"]
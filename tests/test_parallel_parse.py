@@ -0,0 +1,60 @@
+import io
+import os
+
+import pytest
+
+from ingestion import parse_report_parallel, read_report
+from report_parser import parse_report_stream, split_report
+from test_report_parser import EXAMPLE_REPORT, SAMPLE_REPORT, regex_extraction
+
+
+@pytest.fixture(scope="module")
+def report_path(tmp_path_factory):
+    # Sections répétées : chaque plage commence à un endroit différent du rapport
+    path = tmp_path_factory.mktemp("rapports") / "carte.txt"
+    with open(EXAMPLE_REPORT, "rb") as example:
+        path.write_bytes(SAMPLE_REPORT + example.read() + SAMPLE_REPORT)
+    return str(path)
+
+
+@pytest.mark.parametrize("workers", range(2, 9))
+def test_parallel_matches_serial(report_path, workers):
+    with open(report_path, "rb") as report:
+        serial = parse_report_stream(io.BytesIO(report.read()))
+    assert parse_report_parallel(report_path, workers) == serial
+
+
+@pytest.mark.parametrize("workers", range(2, 9))
+def test_pending_blocks_across_ranges(tmp_path, workers):
+    # Un bloc "Test Summary for" dont la ligne Totals: suit un début de section "*XXX Units" :
+    # la plage suivante est réanalysée dans le prolongement de l'état courant
+    data = b"".join(
+        f"Test Summary for U{i}\n*R{i}   Units = Ohms\nTotals:  {i}.50%\n*       PASS\n".encode("ascii")
+        for i in range(200)
+    ) + b"Untested Devices\n   C1  (PMSG is not used)\n*R5   Units = Ohms\n   C2  (PMSG is not used)\n"
+    path = tmp_path / "carte.txt"
+    path.write_bytes(data)
+    result = parse_report_parallel(str(path), workers)
+    assert result == parse_report_stream(io.BytesIO(data)) == regex_extraction(data)
+    assert len(result["coverage"]) == 200 and result["pmsg_not_used"] == ["C1", "C2"]
+
+
+def test_read_report_switches_to_parallel(report_path):
+    serial = read_report(report_path, workers=1)
+    assert read_report(report_path, workers=4, parallel_threshold=0) == serial
+
+
+@pytest.mark.parametrize("chunk_count", [2, 5, 40])
+def test_ranges_start_on_sections(chunk_count):
+    ranges = split_report(SAMPLE_REPORT, chunk_count)
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(SAMPLE_REPORT)
+    assert all(end == next_start for (_, end), (next_start, _) in zip(ranges, ranges[1:]))
+    for start, _ in ranges[1:]:
+        line = SAMPLE_REPORT[start:SAMPLE_REPORT.index(b"\n", start)].lstrip()
+        assert line.startswith((b"Test Summary for", b"*", b"Untested Devices")), line
+
+
+def test_progress_reaches_file_size(report_path):
+    calls = []
+    parse_report_parallel(report_path, 2, progress=lambda done, total: calls.append((done, total)))
+    assert calls[-1] == (os.path.getsize(report_path), os.path.getsize(report_path))
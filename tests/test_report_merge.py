@@ -0,0 +1,28 @@
+import pytest
+
+from report_merge import MERGE_POLICIES, merge_reports
+
+
+def _report(coverage=None, notest=None, pmsg_not_used=None, pass_tests=None):
+    return {"coverage": coverage or {}, "notest": notest or {},
+            "pmsg_not_used": pmsg_not_used or [], "pass_tests": pass_tests or {}}
+
+
+@pytest.mark.parametrize("policy", MERGE_POLICIES)
+def test_overlapping_pmsg_lists_are_deduplicated(policy):
+    reports = [
+        _report(pmsg_not_used=["U1", "U2", "U3"]),
+        _report(pmsg_not_used=["U2", "U3", "U4"]),
+        _report(pmsg_not_used=["U1", "U2", "U3"]),
+    ]
+    merged = merge_reports(reports, policy)
+    assert sorted(merged["pmsg_not_used"]) == ["U1", "U2", "U3", "U4"]
+    assert len(merged["pmsg_not_used"]) == len(set(merged["pmsg_not_used"]))
+
+
+def test_same_report_supplied_twice_keeps_its_counts():
+    report = _report(coverage={"R1": 50.0}, notest={"C1": "pas d'accès"}, pmsg_not_used=["U1", "U2", "U1"])
+    merged = merge_reports([report, report, report], "max_coverage")
+    assert merged["pmsg_not_used"] == ["U1", "U2"]
+    assert merged["coverage"] == {"R1": 50.0}
+    assert merged["notest"] == {"C1": "pas d'accès"}
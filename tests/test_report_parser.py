@@ -0,0 +1,97 @@
+import io
+import os
+import re
+
+import pytest
+
+from report_parser import parse_report_stream
+
+EXAMPLE_REPORT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              "ANALYZEREPORT CEBB3_SA_SB.txt")
+
+SAMPLE_REPORT = b"""\
+Test Summary for U1 (SNJ55189AJ)
+Type                Tested Faults        Detected         Coverage
+Inputs:    4               8                 8             100.00%
+Totals:   14              16                12              75.00%
+====================================================================
+
+Test Summary for U2 (MC14519)
+Outputs:   4               8                 8             100.00%
+Totals:   10              20                 5
+                                                            25.50%
+
+*R1                  Units = Ohms    Hi lim = 1.1K     Lo lim = 900
+*       PASS  EDGE   LBF   (Default Quality Criteria used)
+*C1_A                Units = Farads  Hi lim = 129N     Lo lim = 75N
+*       PASS  EDGE   LBF
+*C1_B                Units = Farads  Hi lim = 129N     Lo lim = 75N
+*       PASS  EDGE   LBF
+*D1                  Units = Volts   Hi lim = 0.8      Lo lim = 0.5
+*       FAIL  EDGE   LBF
+*Q1_BE               Units = Volts   Hi lim = 0.8      Lo lim = 0.5
+*       PASS
+
+ANALYZE General Summary Report
+               C9  (COMPONENT IS TESTED IN PARALLEL WITH C1)   NOTEST
+             CC99  (PMSG is not used)
+
+Untested Devices
+----------------
+               C7  (COMPONENT IS TESTED IN PARALLEL WITH C56)   NOTEST
+             CC10  (PMSG is not used)
+             CC11  (PMSG is not used)
+             CC10  (PMSG is not used)
+ANALYZE General Summary Report
+
+Untested Devices
+               C8  (COMPONENT IS TESTED IN PARALLEL WITH C57)   NOTEST
+"""
+
+
+def regex_extraction(data):
+    """Extraction d'origine par expressions régulières sur le texte complet, servant de référence."""
+    text = data.decode("utf-8", errors="ignore")
+    coverage = {component: float(value) for component, value in
+                re.findall(r'Test Summary for ([A-Z]+\d+).*?Totals:.*?(\d+\.\d+)%', text, re.DOTALL)}
+    notest, pmsg_not_used = {}, []
+    untested = re.search(r'Untested Devices(.*?)(?=General Summary Report|\Z)', text, re.DOTALL)
+    if untested:
+        content = untested.group(1)
+        for component, tested_with in re.findall(
+                r'([A-Z]+\d+)\s+\(COMPONENT IS TESTED IN PARALLEL WITH ([A-Z]+\d+)\)\s+NOTEST', content):
+            notest[component] = f"COMPONENT IS TESTED IN PARALLEL WITH {tested_with}"
+        pmsg_not_used.extend(re.findall(r'([A-Z]+\d+)\s+\(PMSG is not used\)', content))
+    counts = {}
+    for test_id in re.findall(r'\*([A-Z]+\d+(?:_[A-Z]+\d*)*)\s+Units.*?(?:PASS|FAIL)\s', text, re.DOTALL):
+        counts[test_id.split('_')[0]] = counts.get(test_id.split('_')[0], 0) + 1
+    pass_tests = {}
+    for match in re.finditer(r'\*([A-Z]+\d+(?:_[A-Z]+\d*)*)\s+Units.*?((?:PASS|FAIL))', text, re.DOTALL):
+        component = match.group(1).split('_')[0]
+        if counts[component] == 1 and match.group(2).startswith("PASS"):
+            pass_tests[component] = True
+    return {"coverage": coverage, "notest": notest, "pmsg_not_used": pmsg_not_used, "pass_tests": pass_tests}
+
+
+def test_each_section_type():
+    data = parse_report_stream(io.BytesIO(SAMPLE_REPORT))
+    # Pourcentage de la ligne "Totals:", y compris reporté sur la ligne suivante
+    assert data["coverage"] == {"U1": 75.0, "U2": 25.5}
+    # Seule la première section "Untested Devices" est lue, jusqu'au "General Summary Report" suivant
+    assert data["notest"] == {"C7": "COMPONENT IS TESTED IN PARALLEL WITH C56"}
+    assert data["pmsg_not_used"] == ["CC10", "CC11", "CC10"]
+    # Composants testés une seule fois et PASS (C1 a deux tests, D1 est FAIL)
+    assert data["pass_tests"] == {"R1": True, "Q1": True}
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 16, 33, 64, 100, 1024 * 1024])
+def test_blocks_match_regex_extraction(block_size):
+    # Blocs arrondis à la fin de ligne : les blocs et leurs motifs sont coupés à toutes les positions
+    assert parse_report_stream(io.BytesIO(SAMPLE_REPORT), block_size) == regex_extraction(SAMPLE_REPORT)
+
+
+@pytest.mark.parametrize("block_size", [64, 4096, 1024 * 1024])
+def test_example_report_matches_regex_extraction(block_size):
+    with open(EXAMPLE_REPORT, "rb") as report:
+        data = report.read()
+    assert parse_report_stream(io.BytesIO(data), block_size) == regex_extraction(data)